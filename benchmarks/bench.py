@@ -0,0 +1,293 @@
+"""
+Load tests and micro-benchmarks for the main flaskr endpoints.
+
+A database with --posts posts spread over --users users is seeded once and
+ kept under --db-dir, so later runs of the same size start straight away.
+ Each run works on a fresh copy of it, so writes never carry over.
+Each scenario is then driven either through the Flask test client (the
+ default, which measures the app alone) or through a real threaded WSGI
+ server with --server (which adds HTTP parsing and sockets).
+
+For every scenario the p50/p95/p99 latency, requests per second and the
+ peak RSS of the process so far are printed, and with --output the whole
+ run is saved as JSON so two runs can be diffed.
+
+    python benchmarks/bench.py --posts 100000 --requests 2000
+    python benchmarks/bench.py --posts 1000000 --server --concurrency 8 \\
+        --output before.json
+
+Large index pages without the page cache compare the row factories:
+
+    python benchmarks/bench.py --no-cache --per-page 500 --only index \\
+        --row-factory record
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flaskr import create_app  # noqa: E402
+from flaskr.db import close_pool, copy_database, get_db, init_db  # noqa: E402
+from flaskr.render import render_post  # noqa: E402
+
+USERNAME = PASSWORD = 'bench'
+
+# SEEDING
+"""
+User 1 is 'bench' and every other user is 'user<n>'. All users share one
+ password hash, computed once, so seeding doesn't spend its time hashing.
+Posts are handed out to authors round robin, one second apart, and written
+ in transactions of 50000 rows.
+"""
+def body(i):
+    return 'Body of *post* {0}. '.format(i) * 8
+
+def seed(app, posts, users):
+    pwhash = generate_password_hash(PASSWORD)
+    start = datetime(2020, 1, 1)
+    with app.app_context():
+        init_db()
+        db = get_db()
+        db.executemany(
+            'INSERT INTO user (username, password) VALUES (?, ?)',
+            ((USERNAME if n == 0 else 'user{0}'.format(n), pwhash)
+             for n in range(users))
+        )
+        batch = 50000
+        for first in range(0, posts, batch):
+            db.executemany(
+                'INSERT INTO post (title, body, author_id, created,'
+                ' body_html, excerpt, render_version)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (('Post {0}'.format(i), body(i), i % users + 1,
+                  (start + timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S'))
+                 + render_post(body(i))
+                 for i in range(first, min(first + batch, posts)))
+            )
+            db.commit()
+
+"""
+The seeded database is never written to by a run: with scratch=True the app
+ gets a copy of it in a temporary directory, so the 'create' scenario's
+ posts are thrown away with the copy and every run of the same size starts
+ from the same rows. The caller removes the directory (remove_scratch).
+"""
+def make_app(args, scratch=False):
+    seeded = os.path.join(
+        args.db_dir, 'bench-{0}-{1}.sqlite'.format(args.posts, args.users)
+    )
+    os.makedirs(args.db_dir, exist_ok=True)
+    if not os.path.exists(seeded):
+        print('Seeding {0} posts / {1} users into {2}'.format(
+            args.posts, args.users, seeded))
+        begin = time.perf_counter()
+        app = create_app({'DATABASE': seeded})
+        seed(app, args.posts, args.users)
+        close_pool(app)
+        print('Seeded in {0:.1f}s'.format(time.perf_counter() - begin))
+
+    path = seeded
+    if scratch:
+        path = os.path.join(
+            tempfile.mkdtemp(prefix='flaskr-bench-'), os.path.basename(seeded)
+        )
+        source = sqlite3.connect(seeded)
+        try:
+            copy_database(source, path)
+        finally:
+            source.close()
+
+    return create_app({
+        'DATABASE': path,
+        # Benchmarks log in over and over, don't let the limiter refuse them
+        'LOGIN_RATE': 1e9,
+        'LOGIN_BURST': 1e9,
+        'PAGE_CACHE_SIZE': 0 if args.no_cache else 256,
+        'POSTS_PER_PAGE': args.per_page,
+        'ROW_FACTORY': args.row_factory,
+    })
+
+def remove_scratch(app):
+    close_pool(app)
+    shutil.rmtree(os.path.dirname(app.config['DATABASE']), ignore_errors=True)
+
+# SCENARIOS
+"""
+Each scenario is (name, method, path, form data, logged in). Paths and
+ form data may be functions of the request number so writes don't collide.
+Post 1 is always written by 'bench', so its update page can be fetched.
+'/hello' does no work of its own, so with a session cookie it measures the
+ before-request user load.
+"""
+SCENARIOS = (
+    ('index', 'GET', '/', None, False),
+    ('index_logged_in', 'GET', '/', None, True),
+    ('update_form', 'GET', '/1/update', None, True),
+    ('create', 'POST', '/create',
+     lambda n: {'title': 'bench {0}'.format(n), 'body': 'body'}, True),
+    ('login', 'POST', '/auth/login',
+     lambda n: {'username': USERNAME, 'password': PASSWORD}, False),
+    ('user_load', 'GET', '/hello', None, True),
+)
+
+def client_driver(app):
+    anonymous = app.test_client()
+    logged_in = app.test_client()
+    logged_in.post('/auth/login', data={'username': USERNAME, 'password': PASSWORD})
+
+    def request(method, path, data, login):
+        client = logged_in if login else anonymous
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code
+    return request, lambda: None
+
+class QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+def server_driver(app):
+    server = make_server(
+        '127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    port = server.server_port
+
+    def send(method, path, data, cookie=None):
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        headers = {}
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if cookie:
+            headers['Cookie'] = cookie
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        return response
+
+    login = send('POST', '/auth/login', {'username': USERNAME, 'password': PASSWORD})
+    cookie = login.getheader('Set-Cookie').split(';', 1)[0]
+
+    def request(method, path, data, login):
+        return send(method, path, data, cookie if login else None).status
+
+    return request, server.shutdown
+
+# MEASURING
+def percentile(ordered, p):
+    return ordered[int(round(p / 100.0 * (len(ordered) - 1)))]
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024.0 * 1024.0 if platform.system() == 'Darwin' else 1024.0)
+
+def run_scenario(request, scenario, requests, concurrency):
+    name, method, path, data, login = scenario
+
+    def one(n):
+        begin = time.perf_counter()
+        status = request(
+            method,
+            path(n) if callable(path) else path,
+            data(n) if callable(data) else data,
+            login
+        )
+        return time.perf_counter() - begin, status
+
+    begin = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(requests)))
+    else:
+        results = [one(n) for n in range(requests)]
+    wall = time.perf_counter() - begin
+
+    latencies = sorted(latency for latency, status in results)
+    errors = sum(1 for latency, status in results if status >= 500)
+    return {
+        'name': name,
+        'requests': requests,
+        'errors': errors,
+        'rps': requests / wall,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--server', action='store_true',
+                        help='Go through a real WSGI server.')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Turn the page cache off.')
+    parser.add_argument('--per-page', type=int, default=20,
+                        help='Posts per index page.')
+    parser.add_argument('--row-factory', choices=('row', 'record'),
+                        default='row', help='sqlite3.Row or compact records.')
+    parser.add_argument('--only', action='append',
+                        help='Run only the named scenario (repeatable).')
+    parser.add_argument('--db-dir', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data'))
+    parser.add_argument('--output', help='Write the results as JSON here.')
+    args = parser.parse_args(argv)
+
+    app = make_app(args, scratch=True)
+    request, stop = (server_driver if args.server else client_driver)(app)
+
+    results = []
+    try:
+        for scenario in SCENARIOS:
+            if args.only and scenario[0] not in args.only:
+                continue
+            result = run_scenario(request, scenario, args.requests, args.concurrency)
+            results.append(result)
+            print('{name:16} {rps:9.1f} req/s  p50 {p50_ms:7.2f}ms  '
+                  'p95 {p95_ms:7.2f}ms  p99 {p99_ms:7.2f}ms  '
+                  'rss {peak_rss_mb:7.1f}MB  errors {errors}'.format(**result))
+    finally:
+        stop()
+        remove_scratch(app)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'posts': args.posts,
+                'users': args.users,
+                'server': args.server,
+                'concurrency': args.concurrency,
+                'page_cache': not args.no_cache,
+                'per_page': args.per_page,
+                'row_factory': args.row_factory,
+                'python': platform.python_version(),
+                'results': results,
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
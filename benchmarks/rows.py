@@ -0,0 +1,60 @@
+"""
+Micro-benchmark of the row factories on one large index page.
+
+Reads --per-page rows of the index query through sqlite3.Row (with
+ PARSE_DECLTYPES) and through the compact records, touching every column
+ the listing template reads. With --created the 'created' timestamp is read
+ too, which records only parse at that point.
+The database is the one bench.py seeds for the same --posts and --users.
+
+    python benchmarks/rows.py --posts 100000 --per-page 500
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import make_app  # noqa: E402
+from flaskr.db import get_pool  # noqa: E402
+from flaskr.queries import index_page  # noqa: E402
+
+COLUMNS = ('id', 'title', 'author_id', 'username', 'excerpt', 'created_day')
+
+def read_page(db, query, per_page, created):
+    for row in db.execute(query, (per_page,)):
+        for name in COLUMNS:
+            row[name]
+        if created:
+            row['created']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--per-page', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--created', action='store_true',
+                        help="Also read the 'created' timestamp.")
+    parser.add_argument('--db-dir', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data'))
+    args = parser.parse_args(argv)
+
+    query = index_page()
+    for row_factory in ('row', 'record'):
+        args.row_factory = row_factory
+        args.no_cache = False
+        app = make_app(args)
+        db = get_pool(app).connect()
+        seconds = min(timeit.repeat(
+            lambda: read_page(db, query, args.per_page, args.created),
+            number=args.repeat, repeat=5
+        )) / args.repeat
+        db.close()
+        print('{0:8} {1:8.3f}ms per page  {2:6.2f}us per row'.format(
+            row_factory, seconds * 1000, seconds * 1e6 / args.per_page))
+
+if __name__ == '__main__':
+    main()
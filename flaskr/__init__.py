@@ -8,12 +8,73 @@ import os
 
 from flask import Flask
 
+from flaskr.startup import StartupTimer
+
 def create_app(test_config=None):
+    # Time every step below, see startup.py
+    timer = StartupTimer()
+
     # Create and configure the app
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_mapping(
         SECRET_KEY='dev',
         DATABASE=os.path.join(app.instance_path,'flaskr.sqlite'),
+        POSTS_PER_PAGE=20,
+        API_MAX_PAGE_SIZE=100,
+        FEED_SIZE=20,
+        STREAM_BUFFER_SIZE=5,
+        JINJA_BYTECODE_CACHE=True,
+        JINJA_CACHE_DIR=None,
+        ASSETS_FOLDER=None,
+        ASSETS_KEEP_BUILDS=3,
+        COMPRESS_MIN_SIZE=500,
+        COMPRESS_LEVEL=6,
+        COMPRESS_CACHE_SIZE=128,
+        COMPRESS_MIMETYPES=(
+            'text/html', 'text/css', 'text/plain', 'text/xml',
+            'application/json', 'application/atom+xml',
+            'application/javascript', 'image/svg+xml',
+        ),
+        EXCERPT_LENGTH=280,
+        PAGE_CACHE_SIZE=256,
+        PAGE_CACHE_TTL=30,
+        USER_CACHE_SIZE=1024,
+        USER_CACHE_TTL=300,
+        PASSWORD_HASH_METHOD=None,
+        HASH_WORKERS=max(1, (os.cpu_count() or 2) // 2),
+        HASH_QUEUE_SIZE=16,
+        HASH_TIMEOUT=30,
+        LOGIN_RATE=0.5,
+        LOGIN_BURST=10,
+        IMPORT_BATCH_SIZE=500,
+        SLOW_QUERY_MS=100,
+        SERVER_TIMING=True,
+        PROFILER=False,
+        PROFILE_DIR=None,
+        PROFILE_TOKEN_MAX_AGE=3600,
+        SQL_STATS_ENDPOINT=False,
+        WRITE_QUEUE=False,
+        WRITE_BATCH_SIZE=64,
+        WRITE_BATCH_WINDOW_MS=2,
+        WRITE_TIMEOUT=10,
+        DATABASE_URI=False,
+        MAINTENANCE_INTERVAL=None,
+        MAINTENANCE_BUDGET_MS=500,
+        MAINTENANCE_ANALYSIS_LIMIT=400,
+        MAINTENANCE_VACUUM_PAGES=256,
+        MAINTENANCE_CHECKPOINT='PASSIVE',
+        ROW_FACTORY='row',
+        DATABASE_CACHED_STATEMENTS=128,
+        DATABASE_POOL_SIZE=5,
+        DATABASE_POOL_TIMEOUT=10,
+        DATABASE_PRAGMAS={
+            'auto_vacuum': 'incremental',
+            'journal_mode': 'wal',
+            'synchronous': 'normal',
+            'mmap_size': 64 * 1024 * 1024,
+            'cache_size': -8000,
+            'busy_timeout': 5000,
+        },
     )
 
     # THE TESTS
@@ -35,18 +96,62 @@ def create_app(test_config=None):
     def hello():
         return "Hello, world"
 
+    # REGISTERING THE STARTUP REPORT AND TEMPLATE CACHE
+    from . import startup
+    startup.init_app(app, timer)
+
+    # REGISTERING THE RESPONSE COMPRESSION
+    # after_request hooks run last to first, so this one sees the final response
+    with timer.step('compress'):
+        from . import compress
+        compress.init_app(app)
+
+    # REGISTERING THE FINGERPRINTED STATIC FILES
+    with timer.step('assets'):
+        from . import assets
+        assets.init_app(app)
+
+    # REGISTERING THE REQUEST TIMING (first, so it times the other hooks)
+    with timer.step('instrument'):
+        from . import instrument
+        instrument.init_app(app)
+
+    # REGISTERING THE PER-REQUEST PROFILER
+    with timer.step('profiler'):
+        from . import profiler
+        profiler.init_app(app)
+
     #REGISTERING THE DATABASE CONNECTION WITH THE APPLICATION
-    from . import db
-    db.init_app(app)
+    with timer.step('db'):
+        from . import db
+        db.init_app(app)
+
+    # REGISTERING THE IMPORT AND EXPORT COMMANDS
+    with timer.step('transfer'):
+        from . import transfer
+        transfer.init_app(app)
+
+    # REGISTERING THE RENDER-POSTS COMMAND
+    with timer.step('render'):
+        from . import render
+        render.init_app(app)
 
     # REGISTERING THE AUTH BLUEPRINT
-    from . import auth
-    app.register_blueprint(auth.bp)
+    with timer.step('auth blueprint'):
+        from . import auth
+        app.register_blueprint(auth.bp)
 
     # REGISTER THE BLOG BLUEPRINT`
-    from . import blog
-    app.register_blueprint(blog.bp)
-    app.add_url_rule('/', endpoint='index')
+    with timer.step('blog blueprint'):
+        from . import blog
+        app.register_blueprint(blog.bp)
+        app.add_url_rule('/', endpoint='index')
+
+    # REGISTER THE JSON API BLUEPRINT
+    with timer.step('api blueprint'):
+        from . import api
+        app.register_blueprint(api.bp)
 
+    timer.finish()
     # RETURN THE app to start it
     return app
\ No newline at end of file
@@ -0,0 +1,120 @@
+import json
+
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException, abort
+
+from flaskr.blog import fetch_index_page, get_post, post_version
+from flaskr.conditional import add_validators, make_etag, not_modified
+from flaskr.queries import EXCERPT_COLUMN
+
+# THE JSON API BLUEPRINT
+"""
+A read-only JSON view of the posts for clients that don't want the HTML.
+It goes through the same queries as the blog views.
+
+1. fields=
+    A comma separated list of the fields to return. Only those columns are
+    selected, so asking for titles never reads the post bodies.
+2. Cursors
+    /api/posts pages exactly like the index: 'next' and 'prev' are cursors
+    for the before= and after= parameters, and limit= sets the page size
+    up to API_MAX_PAGE_SIZE.
+3. Streaming
+    A list is written out one post at a time by a generator, so the whole
+    JSON document is never built in memory.
+4. ETags
+    Built from post_version (lists) or the post's updated column (single
+    posts) plus the parameters, and answered with 304 before any query.
+"""
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+FIELDS = {
+    'id': 'p.id',
+    'title': 'title',
+    'body': 'body',
+    'body_html': 'body_html',
+    'excerpt': EXCERPT_COLUMN + ' AS excerpt',
+    'created': 'created',
+    'updated': 'updated',
+    'author_id': 'author_id',
+    'author': 'username AS author',
+}
+LIST_FIELDS = ('id', 'title', 'excerpt', 'created', 'author')
+POST_FIELDS = ('id', 'title', 'body', 'body_html', 'created', 'updated', 'author')
+
+def requested_fields(default):
+    fields = request.args.get('fields')
+    if not fields:
+        return default
+    fields = tuple(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown or not fields:
+        abort(400, 'Unknown fields: {0}'.format(', '.join(unknown)))
+    return fields
+
+# The cursor and ETag columns are always selected, whatever was asked for.
+# Columns go in FIELDS order, so fields=title,id and fields=id,title run the
+# same statement (and make the same record class); the JSON keeps the order
+# that was asked for.
+def select_list(fields, required):
+    return ', '.join(required + [FIELDS[f] for f in FIELDS if f in fields])
+
+def to_json(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(repr(value))
+
+def dumps(row, fields):
+    return json.dumps(
+        {f: row[f] for f in fields}, default=to_json, separators=(',', ':')
+    )
+
+## LIST OF POSTS
+@bp.route('/posts')
+def posts():
+    fields = requested_fields(LIST_FIELDS)
+    before = request.args.get('before')
+    after = request.args.get('after')
+    limit = request.args.get('limit', current_app.config['POSTS_PER_PAGE'], type=int)
+    limit = min(max(limit, 1), current_app.config['API_MAX_PAGE_SIZE'])
+
+    version = post_version()
+    etag = make_etag('api.posts', version['version'], fields, before, after, limit)
+    response = not_modified(etag, version['modified'])
+    if response is not None:
+        return response
+
+    rows, next_cursor, prev_cursor = fetch_index_page(
+        before, after, select_list(fields, ['p.id', 'created']),
+        limit
+    )
+
+    def generate():
+        yield '{"posts":['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + dumps(row, fields)
+        yield '],"next":{0},"prev":{1}}}'.format(
+            json.dumps(next_cursor), json.dumps(prev_cursor))
+
+    response = current_app.response_class(generate(), mimetype='application/json')
+    return add_validators(response, etag, version['modified'])
+
+## ONE POST
+@bp.route('/posts/<int:id>')
+def post(id):
+    fields = requested_fields(POST_FIELDS)
+    row = get_post(id, check_author=False, columns=select_list(
+        fields, ['updated', 'render_version']))
+
+    etag = make_etag('api.post', id, row['updated'], row['render_version'], fields)
+    response = not_modified(etag, row['updated'])
+    if response is not None:
+        return response
+    response = current_app.response_class(
+        dumps(row, fields), mimetype='application/json'
+    )
+    return add_validators(response, etag, row['updated'])
+
+@bp.errorhandler(HTTPException)
+def json_error(e):
+    return jsonify(error=e.description), e.code
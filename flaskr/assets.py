@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import with_appcontext
+
+# FINGERPRINTED STATIC FILES
+"""
+'flask build-assets' copies every file in flaskr/static to ASSETS_FOLDER
+ (static/dist by default) under a name that contains a hash of its content,
+ e.g. style.3f2a9c1b.css, writes a gzipped copy next to it and records the
+ names in manifest.json.
+
+1. url_for
+    A url_defaults hook swaps url_for('static', filename='style.css') for
+    the fingerprinted name, so templates don't change.
+2. Serving
+    A fingerprinted file never changes, so it is sent with a year-long
+    'Cache-Control: immutable' and browsers stop revalidating it. When the
+    browser accepts gzip the precompressed copy is sent instead.
+3. No build
+    Without a manifest everything is served from flaskr/static as before.
+    The manifest is read when the app starts, so restart after a build.
+4. Rebuilding
+    A build only adds files; it never deletes the ones a running app (or a
+    page cached somewhere) may still link to. manifest.json is replaced in
+    one step, and builds.json remembers the last ASSETS_KEEP_BUILDS
+    manifests. Files that only older builds used are removed, so old names
+    keep working for that many builds ('--keep 1' prunes them right away).
+    ASSETS_FOLDER may not be the static folder or a folder around it.
+"""
+PREFIX = 'dist/'
+COMPRESSED = ('.gz', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.woff', '.woff2', '.zip')
+
+def assets_folder(app):
+    return app.config['ASSETS_FOLDER'] or os.path.join(app.static_folder, 'dist')
+
+def read_json(path, default):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_json(path, data):
+    # Readers see the old file or the new one, never half of it
+    partial = path + '.tmp'
+    with open(partial, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(partial, path)
+
+def load_manifest(app):
+    return read_json(os.path.join(assets_folder(app), 'manifest.json'), {})
+
+def check_target(source, target):
+    source, target = os.path.realpath(source), os.path.realpath(target)
+    if source == target or source.startswith(target.rstrip(os.sep) + os.sep):
+        raise ValueError(
+            'ASSETS_FOLDER {0} holds the static files it is built from.'.format(target)
+        )
+
+def build_files(manifest):
+    for hashed in manifest.values():
+        name = hashed[len(PREFIX):]
+        yield name
+        yield name + '.gz'
+
+def prune_builds(target, builds, keep):
+    kept, dropped = builds[-keep:], builds[:-keep]
+    used = set(name for manifest in kept for name in build_files(manifest))
+    removed = 0
+    for manifest in dropped:
+        for name in build_files(manifest):
+            path = os.path.join(target, name)
+            if name not in used and os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+    return kept, removed
+
+def build_assets(app, keep=None):
+    source = app.static_folder
+    target = assets_folder(app)
+    check_target(source, target)
+    os.makedirs(target, exist_ok=True)
+
+    manifest = {}
+    for folder, dirs, files in os.walk(source):
+        # Don't fingerprint the output of an earlier build
+        dirs[:] = [d for d in dirs
+                   if os.path.abspath(os.path.join(folder, d)) != os.path.abspath(target)]
+        for name in files:
+            path = os.path.join(folder, name)
+            relative = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            stem, ext = os.path.splitext(relative)
+            hashed = '{0}.{1}{2}'.format(stem, digest, ext)
+            manifest[relative] = PREFIX + hashed
+
+            out = os.path.join(target, hashed)
+            if os.path.isfile(out):
+                # Same name, same content: an earlier build wrote it
+                continue
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            with open(out, 'wb') as f:
+                f.write(content)
+            if not relative.lower().endswith(COMPRESSED):
+                packed = gzip.compress(content, compresslevel=9, mtime=0)
+                if len(packed) < len(content):
+                    with open(out + '.gz', 'wb') as f:
+                        f.write(packed)
+
+    builds_path = os.path.join(target, 'builds.json')
+    builds = read_json(builds_path, [])
+    if not builds or builds[-1] != manifest:
+        builds.append(manifest)
+    builds, removed = prune_builds(
+        target, builds, max(keep or app.config['ASSETS_KEEP_BUILDS'], 1)
+    )
+    write_json(os.path.join(target, 'manifest.json'), manifest)
+    write_json(builds_path, builds)
+    return manifest, removed
+
+def fingerprint_url(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        manifest = current_app.extensions['flaskr_assets']
+        values['filename'] = manifest.get(values['filename'], values['filename'])
+
+def serve_static(filename):
+    if not filename.startswith(PREFIX):
+        return current_app.send_static_file(filename)
+
+    folder = assets_folder(current_app)
+    name = filename[len(PREFIX):]
+    gzipped = name + '.gz'
+    if ('gzip' in request.accept_encodings
+            and os.path.isfile(os.path.join(folder, gzipped))):
+        response = send_from_directory(
+            folder, gzipped,
+            mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        )
+        response.content_encoding = 'gzip'
+    else:
+        response = send_from_directory(folder, name)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 365 * 24 * 3600
+    response.cache_control.immutable = True
+    return response
+
+@click.command('build-assets')
+@click.option('--keep', type=int,
+              help='Builds whose files are kept (default ASSETS_KEEP_BUILDS).')
+@with_appcontext
+def build_assets_command(keep):
+    """Write fingerprinted and gzipped copies of the static files"""
+    try:
+        manifest, removed = build_assets(current_app, keep)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for name, hashed in sorted(manifest.items()):
+        click.echo('{0} -> {1}'.format(name, hashed))
+    if removed:
+        click.echo('Removed {0} files of older builds'.format(removed))
+
+def init_app(app):
+    app.extensions['flaskr_assets'] = load_manifest(app)
+    app.url_defaults(fingerprint_url)
+    app.view_functions['static'] = serve_static
+    app.cli.add_command(build_assets_command)
@@ -2,9 +2,10 @@ import functools
 
 from flask import (Blueprint, render_template, request, url_for, g, flash, redirect, session)
 
-from werkzeug.security import check_password_hash, generate_password_hash
-
+from flaskr import queries
+from flaskr.cache import get_user_cache
 from flaskr.db import get_db
+from flaskr.hashing import hash_password, throttle, verify_password
 
 """
 A Blueprint is a way to organize a group of related views and other code. 
@@ -19,6 +20,29 @@ bp = Blueprint('auth', __name__,url_prefix='/auth')
 
 # If the user id was saved in a session, load the user's information and make 
 # the the information available to other views
+"""
+This runs before every request, so the user is kept in the user cache and
+ the database is only asked on a miss. Only the columns the views and
+ templates use are loaded; the password hash never leaves the login view.
+Anything that changes a user row must call invalidate_user afterwards.
+"""
+def load_user(user_id):
+    cache = get_user_cache()
+    user = cache.get(user_id)
+    if user is None:
+        row = get_db().execute(queries.USER_BY_ID, (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = {'id': row['id'], 'username': row['username']}
+        cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id):
+    get_user_cache().delete(user_id)
+
+def user_cache_stats():
+    return get_user_cache().stats()
+
 @bp.before_app_request
 def load_logged_in_user():
     user_id = session.get('user_id')
@@ -26,9 +50,7 @@ def load_logged_in_user():
     if user_id is None:
         g.user = None
     else:
-        g.user = get_db().execute(
-            'SELECT * FROM user WHERE id = ?', (user_id,)
-        ).fetchone()
+        g.user = load_user(user_id)
 
 """
 When the user visits the /auth/register URL, the register view will return
@@ -42,6 +64,7 @@ def register():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        throttle(username, request.remote_addr)
         db = get_db()
         error=None
 
@@ -51,15 +74,15 @@ def register():
         elif not password:
             error = "Password is required!" # Ensure field is not empty
         elif db.execute(
-            'SELECT id FROM user WHERE username=?', (username,)
+            queries.USER_BY_USERNAME, (username,)
             ).fetchone() is not None:
             error = 'User {} is already registered.'.format(username) 
             # Ensures the user is not already registered
 
         if error is None:
             db.execute(
-                'INSERT INTO user (username, password) VALUES (?, ?)',
-            (username, generate_password_hash(password))
+                queries.INSERT_USER,
+            (username, hash_password(password))
             ) # Insert the new user to the DB and encrypt the password
             db.commit() # Save changes to the DB
             return redirect(url_for('auth.login'))
@@ -75,15 +98,16 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        throttle(username, request.remote_addr)
         db = get_db()
         error = None
-        user = db.execute('SELECT * FROM user WHERE username =?', (username,)).fetchone()
+        user = db.execute(queries.USER_BY_USERNAME, (username,)).fetchone()
 
         if user is None:
             error = "Incorrect username!"
-        elif not check_password_hash(user['password'], password):
+        elif not verify_password(user['password'], password):
             error = "Invalid password!"
-            #check_password_hash() hashes the submitted password in the same way as the stored hash and securely compares them. If they match, the password is valid.
+            #verify_password() runs check_password_hash() on the hashing pool. It hashes the submitted password in the same way as the stored hash and securely compares them. If they match, the password is valid.
 
         """
         Session is a dict that stores data across requests.
@@ -1,8 +1,14 @@
-from flask import (Blueprint, url_for, redirect, render_template, flash, g, request)
+from flask import (Blueprint, url_for, redirect, render_template, flash, g, request, current_app, make_response, stream_template)
+from markupsafe import Markup, escape
 from werkzeug.exceptions import abort
 
 from flaskr.auth import login_required
-from flaskr.db import get_db
+from flaskr.cache import get_page_cache, post_tag
+from flaskr.conditional import add_validators, make_etag, not_modified
+from flaskr import queries
+from flaskr.db import get_db, write
+from flaskr.queries import INDEX_COLUMNS, POST_COLUMNS
+from flaskr.render import render_post
 
 # THE BLOG BLUEPRINT
 bp = Blueprint('blog', __name__)
@@ -10,16 +16,316 @@ bp = Blueprint('blog', __name__)
 # THE ROUTES 
 
 ## INDEX PAGE
+"""
+The index is paginated with a keyset (cursor) instead of OFFSET.
+A cursor is the (created, id) pair of the last post on a page, so the next
+ page starts right after it in the post_created_id index. Every page costs
+ the same no matter how deep into the posts the reader goes.
+"""
+def encode_cursor(post):
+    return '{0}_{1}'.format(post['created'], post['id'])
+
+def decode_cursor(cursor):
+    created, sep, id = cursor.rpartition('_')
+    if not sep or not created or not id.isdigit():
+        abort(400, "Invalid cursor.")
+    return created, int(id)
+
+"""
+stream_index_page runs the query for one page of posts, newest first, and
+ returns a PostStream that reads the rows from the cursor as they are
+ looped over. fetch_index_page is the same page as a list, with the cursors
+ of the pages around it. 'columns' is the select list, so the JSON API can
+ ask for only the fields it needs; it must include p.id and created, which
+ the cursors are made of.
+
+PostStream stops after per_page rows; the query asks for one more so it
+ knows whether there is an older page. The cursors come from the first and
+ last rows, so they are only known once the loop is done. The templates
+ read them in the nav bar, below the posts.
+"""
+class PostStream:
+    def __init__(self, rows, per_page, has_prev, has_next=False):
+        self.rows = rows
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.ids = []
+        self.first = self.last = None
+
+    def __iter__(self):
+        for row in self.rows:
+            if len(self.ids) == self.per_page:
+                self.has_next = True
+                break
+            if self.first is None:
+                self.first = row
+            self.last = row
+            self.ids.append(row['id'])
+            yield row
+
+    @property
+    def next_cursor(self):
+        if self.last is not None and self.has_next:
+            return encode_cursor(self.last)
+
+    @property
+    def prev_cursor(self):
+        if self.first is not None and self.has_prev:
+            return encode_cursor(self.first)
+
+def stream_index_page(before=None, after=None, columns=INDEX_COLUMNS,
+                      per_page=None, author_id=None):
+    db = get_db()
+    per_page = per_page or current_app.config['POSTS_PER_PAGE']
+
+    # An author's feed is the same walk through post_author_created
+    by_author = author_id is not None
+    params = (author_id,) if by_author else ()
+
+    def page(direction, cursor=()):
+        return db.execute(
+            queries.index_page(columns, by_author, direction),
+            params + cursor + (per_page + 1,)
+        )
+
+    if after:
+        # Walk backwards (oldest first) from the cursor, then flip the page.
+        # The flip needs the whole page, which is at most per_page rows.
+        posts = page('after', decode_cursor(after)).fetchall()
+        has_prev = len(posts) > per_page
+        return PostStream(posts[:per_page][::-1], per_page, has_prev, True)
+    elif before:
+        posts = page('before', decode_cursor(before))
+        return PostStream(posts, per_page, True)
+    else:
+        return PostStream(page(None), per_page, False)
+
+def fetch_index_page(before=None, after=None, columns=INDEX_COLUMNS,
+                     per_page=None, author_id=None):
+    stream = stream_index_page(before, after, columns, per_page, author_id)
+    posts = list(stream)
+    return posts, stream.next_cursor, stream.prev_cursor
+
+def post_version():
+    return get_db().execute(queries.POST_VERSION).fetchone()
+
+"""
+The list of posts is rendered as a fragment and kept in the page cache.
+Only the Edit links differ between viewers, so the key includes the user
+ id; the nav bar and flashed messages around it are rendered every time.
+Before any of that, the post_version row is enough to answer a client
+ that already has the current page with 304 Not Modified.
+The index and the author feeds are both lists like this; 'page' names the
+ cache group and 'page_url' is where the Newer/Older links point.
+
+Pages are streamed instead of built in memory first:
+
+1. stream_page
+    Renders the template with stream_template, so the head of the page is
+    sent before the posts are read. Jinja's output is joined into chunks
+    of STREAM_BUFFER_SIZE pieces, so the response isn't sent one tag at a
+    time.
+2. stream_posts
+    Renders the fragment while the rows come off the cursor and hands it
+    to the page piece by piece. The pieces are kept too, and once the last
+    one is sent the whole fragment goes into the page cache. A cache hit
+    is streamed as a single piece.
+    A post written while the page was being sent has already invalidated
+    the cache by then, so the fragment is stored with the cache generation
+    from before the query and dropped if it has moved on.
+"""
+def stream_page(template, **context):
+    chunks = stream_template(template, **context)
+    size = current_app.config['STREAM_BUFFER_SIZE']
+
+    def generate():
+        buffer = []
+        try:
+            for chunk in chunks:
+                buffer.append(chunk)
+                if len(buffer) >= size:
+                    yield ''.join(buffer)
+                    buffer = []
+            if buffer:
+                yield ''.join(buffer)
+        finally:
+            # Lets stream_template pop the request context it kept
+            chunks.close()
+
+    return current_app.response_class(generate())
+
+def stream_posts(key, posts, page_url, generation):
+    template = current_app.jinja_env.get_template('blog/_posts.html')
+    context = {'posts': posts, 'page_url': page_url}
+    current_app.update_template_context(context)
+
+    chunks = []
+    for chunk in template.generate(context):
+        chunks.append(chunk)
+        yield Markup(chunk)
+    get_page_cache().set(
+        key, ''.join(chunks), [post_tag(id) for id in posts.ids], generation
+    )
+
+def render_post_list(page, template, page_url, author_id=None, **context):
+    before = request.args.get('before')
+    after = request.args.get('after')
+    viewer = g.user['id'] if g.user else None
+
+    # Taken before anything is read, see stream_posts
+    cache = get_page_cache()
+    generation = cache.generation
+    version = post_version()
+    etag = make_etag(page, author_id, version['version'], viewer, before, after)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+
+    key = (page, author_id, viewer, before, after)
+    fragment = cache.get(key)
+    if fragment is None:
+        # The query runs now; its rows are read while the page is sent
+        posts = stream_index_page(before, after, author_id=author_id)
+        posts_html = stream_posts(key, posts, page_url, generation)
+    else:
+        posts_html = [Markup(fragment)]
+
+    response = stream_page(template, posts_html=posts_html, **context)
+    return add_validators(response, etag)
+
 @bp.route('/')
 def index():
-    db = get_db()
-    posts = db.execute(
-        'SELECT p.id, title, body, created, author_id, username'
-        ' FROM post p JOIN user u ON p.author_id = u.id'
-        ' ORDER BY created DESC'
-    ).fetchall()
+    return render_post_list('index', 'blog/index.html', url_for('blog.index'))
+
+## AUTHOR PAGE
+"""
+/u/<username> lists one author's posts, served by the post_author_created
+ index. The post count comes from user.post_count, which triggers keep up
+ to date on every insert and delete, instead of a COUNT(*) per page view.
+'flask check-post-counts' recomputes the counters if they ever drift.
+"""
+@bp.route('/u/<username>')
+def author(username):
+    user = get_db().execute(queries.AUTHOR_BY_USERNAME, (username,)).fetchone()
+    if user is None:
+        abort(404, "User {0} does not exist.".format(username))
 
-    return render_template('blog/index.html', posts=posts)
+    return render_post_list(
+        'author', 'blog/author.html',
+        url_for('blog.author', username=username),
+        author_id=user['id'], author=user
+    )
+
+## ATOM FEED
+"""
+Feed readers poll all the time, so the serialized feed is kept in the page
+ cache with its ETag and only rebuilt after a post is written. A poll with
+ a matching If-None-Match is then answered with 304 without a single query.
+Each entry carries the post's stored HTML (or its escaped plain body when
+ it hasn't been rendered yet), so building the feed never renders Markdown.
+
+The links in the feed are absolute, made from the Host the request came
+ in on, so the cached feed is kept per host: one poller's Host header never
+ ends up in the feed another one reads.
+The feed's updated time (and Last-Modified) is post_version.modified, which
+ moves on deletes too, unlike the newest post's own 'updated'.
+"""
+@bp.route('/feed.atom')
+def feed():
+    cache = get_page_cache()
+    key = ('feed', request.host_url)
+    cached = cache.get(key)
+    if cached is None:
+        updated = post_version()['modified']
+        rows = get_db().execute(
+            queries.FEED, (current_app.config['FEED_SIZE'],)
+        ).fetchall()
+        # content is HTML: a plain body is escaped into HTML first
+        posts = [
+            dict(row, content=row['content'] if row['render_version']
+                 else str(escape(row['content'])))
+            for row in rows
+        ]
+        xml = render_template(
+            'blog/feed.xml', posts=posts,
+            updated=updated.strftime('%Y-%m-%dT%H:%M:%SZ')
+        ).encode('utf8')
+        cached = (xml, make_etag('feed', xml), updated)
+        cache.set(key, cached, [post_tag(post['id']) for post in posts])
+
+    xml, etag, updated = cached
+    response = not_modified(etag, updated)
+    if response is not None:
+        return response
+    response = current_app.response_class(
+        xml, mimetype='application/atom+xml'
+    )
+    return add_validators(response, etag, updated)
+
+## SEARCH PAGE
+"""
+Search goes through the post_fts full-text index instead of a LIKE scan.
+
+1. fts_query
+    Every word the user typed is quoted, so characters like " or * are
+    searched for literally instead of being read as FTS5 query syntax.
+2. bm25
+    Ranks the matches; title hits weigh more than body hits.
+3. snippet
+    Returns the matching part of the body with the hits wrapped in marker
+    characters. The text is escaped first and only then are the markers
+    turned into <mark> tags, so post bodies can't inject HTML.
+
+The page number becomes an OFFSET, which SQLite keeps in a signed 64-bit
+ integer; a page past that is answered with 400 Bad Request.
+"""
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+MAX_OFFSET = 2 ** 63 - 1
+
+def fts_query(q):
+    return ' '.join(
+        '"{0}"'.format(term.replace('"', '""')) for term in q.split()
+    )
+
+def highlight(snippet):
+    return Markup(
+        str(escape(snippet))
+        .replace(SNIPPET_START, '<mark>')
+        .replace(SNIPPET_END, '</mark>')
+    )
+
+@bp.route('/search')
+def search():
+    q = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = current_app.config['POSTS_PER_PAGE']
+    results = []
+    if (page - 1) * per_page > MAX_OFFSET:
+        abort(400, "Page out of range.")
+
+    if q:
+        rows = get_db().execute(
+            queries.SEARCH,
+            (SNIPPET_START, SNIPPET_END, '\u2026', fts_query(q),
+             per_page + 1, (page - 1) * per_page)
+        )
+        results = PostStream(rows, per_page, page > 1)
+
+    return stream_page(
+        'blog/search.html', q=q, results=results, page=page,
+        highlight=highlight
+    )
+
+# A new or deleted post shifts every page of every list
+def invalidate_lists():
+    cache = get_page_cache()
+    cache.invalidate_group('index')
+    cache.invalidate_group('author')
+    cache.invalidate_group('feed')
+
+def render_body(body):
+    return render_post(body, current_app.config['EXCERPT_LENGTH'])
 
 ## CREATE ROUTE
 @bp.route('/create', methods=('GET','POST'))
@@ -36,13 +342,11 @@ def create():
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                'INSERT INTO post(title, body, author_id)'
-                'VALUES (?,?,?)',
-                (title, body, g.user['id'])
+            write(
+                queries.INSERT_POST,
+                (title, body, g.user['id']) + render_body(body)
             )
-            db.commit()
+            invalidate_lists()
             return redirect(url_for('blog.index'))
     return render_template('blog/create.html')
 
@@ -53,13 +357,8 @@ Avoid duplicity by making a function that will be used in both views.
 """
 
 # FETCH A POST
-def get_post(id, check_author=True):
-    post = get_db().execute(
-        'SELECT p.id, title, body, created, author_id, username'
-        ' FROM post p JOIN user u ON p.author_id = u.id'
-        ' WHERE p.id = ?',
-        (id,)
-    ).fetchone()
+def get_post(id, check_author=True, columns=POST_COLUMNS):
+    post = get_db().execute(queries.post_by_id(columns), (id,)).fetchone()
 
     if post is None:
         abort(404, "Post id {0} does not exist.".format(id))
@@ -69,6 +368,24 @@ def get_post(id, check_author=True):
 
     return post
 
+## POST PAGE
+"""
+Shows one post with its stored HTML, so viewing a post never runs the
+ Markdown renderer. Posts saved before rendering existed fall back to
+ their plain body until 'flask render-posts' has been run.
+"""
+@bp.route('/<int:id>')
+def detail(id):
+    post = get_post(id, check_author=False)
+    viewer = g.user['id'] if g.user else None
+
+    etag = make_etag('detail', id, post['updated'], post['render_version'], viewer)
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(render_template('blog/detail.html', post=post))
+    return add_validators(response, etag)
+
 ## UPDATE ROUTE
 @bp.route('/<int:id>/update', methods=('GET', 'POST'))
 @login_required
@@ -86,23 +403,27 @@ def update(id):
         if error is not None:
             flash(error)
         else:
-            db = get_db()
-            db.execute(
-                'UPDATE post set title = ?, body = ?'
-                ' WHERE id = ?',
-                (title, body, id)
+            write(
+                queries.UPDATE_POST,
+                (title, body) + render_body(body) + (id,)
             )
-            db.commit()
+            get_page_cache().invalidate(post_tag(id))
             return redirect(url_for('blog.index')) 
-    
-    return render_template('blog/update.html', post=post)
+        return render_template('blog/update.html', post=post)
+
+    # The edit form only changes when the post does
+    etag = make_etag('update', id, post['updated'], g.user['id'])
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    response = make_response(render_template('blog/update.html', post=post))
+    return add_validators(response, etag)
 
 ## DELETE ROUTE
 @bp.route('/<int:id>/delete', methods=('POST',))
 @login_required
 def delete(id):
     get_post(id)
-    db = get_db()
-    db.execute('DELETE FROM post WHERE id =?', (id,))
-    db.commit()
+    write(queries.DELETE_POST, (id,))
+    invalidate_lists()
     return redirect(url_for('blog.index'))
\ No newline at end of file
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+# THE IN-PROCESS CACHES
+"""
+Most requests to the index produce exactly the same HTML, so the rendered
+ list of posts is kept in memory and reused until a write changes it.
+The logged in user is looked up before every request, so it is kept in a
+ second cache of the same kind.
+
+1. Bounded LRU with a TTL
+    At most 'size' entries, the least recently used is dropped first.
+    Entries older than 'ttl' seconds are treated as missing.
+    The cache lives in one process, so the TTL also bounds how long another
+    worker can keep serving an entry after this one has invalidated it.
+2. Tags
+    Every entry remembers which posts it shows. Editing a post only drops
+    the entries tagged with that post, while creating or deleting one drops
+    a whole group (e.g. every index page) since the pages shift.
+3. size = 0
+    Turns the cache off; get always misses and set does nothing.
+4. Generations
+    Every invalidation bumps 'generation'. A value that was read from the
+    database before a write but stored after it would be stale, so set()
+    can be given the generation seen before the read and then stores
+    nothing if anything was invalidated in between.
+"""
+class LRUCache(object):
+    def __init__(self, size, ttl=None):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, tags, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, tags=(), generation=None):
+        if not self.size:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, frozenset(tags), expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate(self, tag):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, e in self._entries.items() if tag in e[1]]:
+                del self._entries[key]
+
+    def invalidate_group(self, group):
+        # Keys are tuples that start with the name of the page they hold
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._entries if k[0] == group]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+_cache_lock = threading.Lock()
+
+def _get_cache(name, size_key, ttl_key, app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get(name)
+    if cache is None:
+        with _cache_lock:
+            cache = app.extensions.get(name)
+            if cache is None:
+                cache = app.extensions[name] = LRUCache(
+                    app.config[size_key], app.config[ttl_key]
+                )
+    return cache
+
+def get_page_cache(app=None):
+    return _get_cache(
+        'flaskr_page_cache', 'PAGE_CACHE_SIZE', 'PAGE_CACHE_TTL', app
+    )
+
+def get_user_cache(app=None):
+    return _get_cache(
+        'flaskr_user_cache', 'USER_CACHE_SIZE', 'USER_CACHE_TTL', app
+    )
+
+def post_tag(id):
+    return ('post', id)
@@ -0,0 +1,100 @@
+import zlib
+
+from flask import current_app, request
+
+from flaskr.cache import LRUCache
+
+# RESPONSE COMPRESSION
+"""
+Compresses responses with gzip or deflate, whichever the client prefers.
+
+1. What is skipped
+    Responses under COMPRESS_MIN_SIZE bytes, mimetypes not listed in
+    COMPRESS_MIMETYPES, responses that already have a Content-Encoding
+    (like the precompressed static files), file responses, anything that
+    isn't a 200, and anything marked 'Cache-Control: no-transform'.
+2. Streamed responses
+    Their chunks are compressed one by one as they are sent, so the page
+    still starts arriving before it is finished.
+3. Cached pages
+    A response with an ETag is the same bytes until the ETag changes, so
+    its compressed form is kept in a small LRU cache keyed on the path,
+    ETag and encoding (COMPRESS_CACHE_SIZE entries) instead of being
+    compressed again on every hit. A streamed response is stored once it
+    has been sent in full; a cache hit replaces the stream.
+"""
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+def compressor(encoding):
+    return zlib.compressobj(
+        current_app.config['COMPRESS_LEVEL'], zlib.DEFLATED, WBITS[encoding]
+    )
+
+# Runs after the request has ended, so the engine is made up front
+def compress_chunks(chunks, engine, store=None):
+    sent = []
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf8')
+        data = engine.compress(chunk)
+        if not data:
+            # Don't hold back a chunk the client is waiting for
+            data = engine.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            sent.append(data)
+            yield data
+    data = engine.flush()
+    sent.append(data)
+    yield data
+    if store is not None:
+        store(b''.join(sent))
+
+def should_compress(response):
+    config = current_app.config
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+        and not response.cache_control.no_transform
+        and response.mimetype in config['COMPRESS_MIMETYPES']
+        and (response.is_streamed
+             or (response.content_length or 0) >= config['COMPRESS_MIN_SIZE'])
+    )
+
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+    if not should_compress(response):
+        return response
+    encoding = request.accept_encodings.best_match(('gzip', 'deflate'))
+    if encoding is None:
+        return response
+
+    etag = response.headers.get('ETag')
+    cache = current_app.extensions['flaskr_compress_cache']
+    key = (request.path, etag, encoding)
+    data = cache.get(key) if etag else None
+
+    if data is not None:
+        # Also skips rendering a streamed page the client already had
+        response.close()
+        response.set_data(data)
+    elif response.is_streamed:
+        store = (lambda data: cache.set(key, data)) if etag else None
+        response.response = compress_chunks(
+            response.response, compressor(encoding), store
+        )
+        response.headers.pop('Content-Length', None)
+    else:
+        engine = compressor(encoding)
+        data = engine.compress(response.get_data()) + engine.flush()
+        if etag:
+            cache.set(key, data)
+        response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_app(app):
+    app.extensions['flaskr_compress_cache'] = LRUCache(
+        app.config['COMPRESS_CACHE_SIZE']
+    )
+    app.after_request(compress_response)
@@ -0,0 +1,60 @@
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request, session
+
+# CONDITIONAL GETS
+"""
+A client that already holds a page sends back its ETag (If-None-Match) or
+ its Last-Modified date (If-Modified-Since). When the page hasn't changed
+ the view can answer 304 Not Modified without querying or rendering it.
+
+1. Validators
+    Views build them from cheap values such as the post_version row that
+    the post triggers keep up to date, never from the rendered page.
+    The viewer's id is part of the ETag of every HTML page because the nav
+    bar and the Edit links differ per user.
+    If-Modified-Since has no room for the viewer: a client that logged in
+    since would be told its logged out copy is current. So Last-Modified is
+    only sent, and If-Modified-Since only honoured, on responses that are
+    the same for everyone (the feed and the JSON API). Pages leave out
+    last_modified and are validated by their ETag alone.
+2. Flashed messages
+    A page with flashed messages waiting must be rendered to show them,
+    so no 304 is sent while there are any.
+3. Cache-Control: no-cache
+    Clients and proxies may store the page but must revalidate it first.
+"""
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf8')).hexdigest()
+
+def utc(timestamp):
+    # SQLite's CURRENT_TIMESTAMP is UTC but comes back as a naive datetime
+    if timestamp is not None and timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def add_validators(response, etag, last_modified=None):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = utc(last_modified)
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+def not_modified(etag, last_modified=None):
+    """Return a 304 response if the client's copy is current, else None"""
+    if session.get('_flashes'):
+        return None
+
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        fresh = utc(last_modified).replace(microsecond=0) <= request.if_modified_since
+    else:
+        fresh = False
+
+    if not fresh:
+        return None
+    response = current_app.response_class(status=304)
+    return add_validators(response, etag, last_modified)
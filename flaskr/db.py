@@ -1,8 +1,18 @@
+import os
+import queue
 import sqlite3
+import threading
+from concurrent.futures import TimeoutError
 
 import click
 from flask import current_app, g
 from flask.cli import with_appcontext
+from werkzeug.exceptions import ServiceUnavailable
+
+from flaskr import queries
+from flaskr.cache import get_page_cache
+from flaskr.instrument import InstrumentedConnection
+from flaskr.records import record_factory
 
 
 # THE FIRST THING to do when working with SQLite databases and most others
@@ -34,22 +44,225 @@ from flask.cli import with_appcontext
     Used to create beautiful command line interfaces in a composable way
 """
 
+# THE CONNECTION POOL
+"""
+Opening a SQLite connection means opening the file and parsing the schema,
+ which is wasted work when it happens on every request.
+Instead each process keeps a small pool of ready connections per app.
+get_db borrows one for the request and close_db hands it back.
+
+1. check_same_thread=False
+    A pooled connection is used by whichever worker thread borrows it.
+    The pool makes sure only one thread holds it at a time.
+2. DATABASE_PRAGMAS
+    Applied once when a connection is opened. WAL lets readers carry on
+    while a writer commits, busy_timeout makes a writer wait for the lock
+    instead of failing straight away. auto_vacuum only takes effect on a
+    new, empty database, so it comes before journal_mode, which writes the
+    file header.
+3. DATABASE_POOL_SIZE
+    The most connections the pool will open. 0 turns pooling off and
+    falls back to a fresh connection per request. A request that waits
+    longer than DATABASE_POOL_TIMEOUT seconds for a connection gets 503
+    Service Unavailable.
+    A streamed page (see blog.py) holds its connection until the last byte
+    has been sent, so a slow client keeps one connection busy for as long
+    as it takes to read the page. Size the pool for the number of worker
+    threads and let the front server buffer responses for slow clients.
+4. DATABASE_URI
+    Read DATABASE as an SQLite URI, e.g. 'file:name?mode=memory&cache=shared'
+    for an in-memory database that all pooled connections share. It lives
+    as long as one connection to it is open.
+5. ROW_FACTORY
+    'row' gives sqlite3.Row with PARSE_DECLTYPES. 'record' gives the
+    compact records in records.py, which parse timestamps only when read.
+6. DATABASE_CACHED_STATEMENTS
+    How many compiled statements each connection keeps. queries.py holds
+    every statement as one fixed text, so this only needs to be larger
+    than the number of queries the app runs.
+"""
+# ROW_FACTORY -> (detect_types, row_factory)
+ROW_FACTORIES = {
+    'row': (sqlite3.PARSE_DECLTYPES, sqlite3.Row),
+    'record': (0, record_factory),
+}
+
+class PoolTimeout(RuntimeError):
+    pass
+
+class ConnectionPool(object):
+    def __init__(self, database, size, timeout=None, pragmas=None, uri=False,
+                 row_factory='row', cached_statements=128):
+        self.database = database
+        self.uri = uri
+        self.cached_statements = cached_statements
+        self.detect_types, self.row_factory = ROW_FACTORIES[row_factory]
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._acquired = 0
+        self._reused = 0
+        self._waited = 0
+
+    def connect(self):
+        db = sqlite3.connect(
+            self.database,
+            detect_types=self.detect_types,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+            cached_statements=self.cached_statements,
+            uri=self.uri
+        )
+        db.row_factory = self.row_factory
+        # Connection setup is not a query of the request that opened it,
+        # so it skips the instrumented execute
+        for name, value in self.pragmas.items():
+            sqlite3.Connection.execute(db, 'PRAGMA {0} = {1}'.format(name, value))
+        return db
+
+    def acquire(self):
+        with self._lock:
+            self._acquired += 1
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                db = None
+            if db is not None:
+                self._reused += 1
+                return db
+            if self._opened < self.size:
+                self._opened += 1
+                new = True
+            else:
+                self._waited += 1
+                new = False
+
+        if new:
+            try:
+                return self.connect()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout('Timed out waiting for a database connection.')
+
+    def release(self, db):
+        # Never hand the next request a half finished transaction
+        if db.in_transaction:
+            db.rollback()
+        self._idle.put(db)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'idle': self._idle.qsize(),
+                'in_use': self._opened - self._idle.qsize(),
+                'acquired': self._acquired,
+                'reused': self._reused,
+                'waited': self._waited,
+            }
+
+_pool_lock = threading.Lock()
+
+def get_pool(app=None):
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('flaskr_db_pool')
+    if pool is None:
+        with _pool_lock:
+            pool = app.extensions.get('flaskr_db_pool')
+            if pool is None:
+                pool = app.extensions['flaskr_db_pool'] = ConnectionPool(
+                    app.config['DATABASE'],
+                    app.config['DATABASE_POOL_SIZE'],
+                    app.config['DATABASE_POOL_TIMEOUT'],
+                    app.config['DATABASE_PRAGMAS'],
+                    app.config['DATABASE_URI'],
+                    app.config['ROW_FACTORY'],
+                    app.config['DATABASE_CACHED_STATEMENTS'],
+                )
+    return pool
+
+def close_pool(app=None):
+    app = app or current_app._get_current_object()
+    pool = app.extensions.pop('flaskr_db_pool', None)
+    if pool is not None:
+        pool.close()
+
+def pool_stats():
+    return get_pool().stats()
+
 # CONNNECT TO THE DATABASE
 
 def get_db():
     if 'db' not in g:
-        g.db = sqlite3.connect(
-            current_app.config['DATABASE'],
-            detect_types=sqlite3.PARSE_DECLTYPES
-        )
-        g.db.row_factory = sqlite3.Row
+        pool = get_pool()
+        if pool.size:
+            try:
+                g.db = pool.acquire()
+            except PoolTimeout:
+                raise ServiceUnavailable('The server is busy, try again.')
+        else:
+            g.db = pool.connect()
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
 
     if db is not None:
-        db.close()
+        pool = get_pool()
+        if pool.size:
+            pool.release(db)
+        else:
+            db.close()
+
+# WRITING
+"""
+Views change data through write() rather than execute() plus commit().
+Normally it does exactly that on the request's connection. With the
+ WRITE_QUEUE option on it hands the statement to the group-commit writer
+ (see writer.py) and waits until it has been committed.
+Either way it returns the lastrowid of the statement.
+
+A queued write that isn't committed within WRITE_TIMEOUT seconds is
+ answered with 503 Service Unavailable, but it stays in the queue and may
+ still be committed afterwards. The view never gets to invalidate the page
+ cache for it then, so the whole page cache is cleared once it lands.
+"""
+def write(sql, parameters=()):
+    if current_app.config['WRITE_QUEUE']:
+        from flaskr.writer import get_writer
+        future = get_writer().submit([(sql, parameters)])
+        try:
+            return future.result(timeout=current_app.config['WRITE_TIMEOUT'])
+        except TimeoutError:
+            cache = get_page_cache()
+            future.add_done_callback(lambda future: cache.clear())
+            raise ServiceUnavailable(
+                'Saving is taking too long; the change may still be saved.'
+            )
+
+    db = get_db()
+    cursor = db.execute(sql, parameters)
+    db.commit()
+    return cursor.lastrowid
 
 # Add the Python functions that will run the SQL commands in 'schema.sql'
 """
@@ -65,6 +278,8 @@ def init_db():
 
     with current_app.open_resource('schema.sql') as f:
         db.executescript(f.read().decode('utf8'))
+    # schema.sql is the latest schema, so there is nothing left to migrate
+    db.execute('PRAGMA user_version = {0:d}'.format(len(list_migrations())))
 
 @click.command('init-db')
 @with_appcontext
@@ -73,6 +288,118 @@ def init_db_command():
     init_db()
     click.echo('Initialised the database')
 
+# COPYING A DATABASE
+"""
+Copies the database open on 'source' into the file at 'path' with SQLite's
+ backup API, page by page. The tests build their database once and give
+ every test a fresh copy this way instead of running the schema again.
+"""
+def copy_database(source, path):
+    target = sqlite3.connect(path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+
+# MIGRATIONS
+"""
+init-db wipes the database, so live databases are changed by migrations.
+Each file in flaskr/migrations is one step, named NNNN_description.sql and
+ applied in order. SQLite's user_version pragma records how many steps a
+ database has had, so 'flask db-migrate' only runs the ones it is missing.
+
+Every step runs inside one transaction together with the user_version
+ bump: a step that fails leaves the database exactly as it was before it.
+"""
+def list_migrations():
+    folder = os.path.join(current_app.root_path, 'migrations')
+    names = sorted(n for n in os.listdir(folder) if n.endswith('.sql'))
+    for position, name in enumerate(names, 1):
+        if int(name.split('_', 1)[0]) != position:
+            raise RuntimeError('Migration {0} is out of sequence.'.format(name))
+    return names
+
+def migrate_db():
+    db = get_db()
+    current = db.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+
+    for version, name in enumerate(list_migrations(), 1):
+        if version <= current:
+            continue
+        with current_app.open_resource('migrations/' + name) as f:
+            script = f.read().decode('utf8')
+        try:
+            db.executescript(
+                'BEGIN;\n{0}\nPRAGMA user_version = {1:d};\nCOMMIT;'.format(
+                    script, version)
+            )
+        except sqlite3.Error:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        applied.append(name)
+    return applied
+
+@click.command('db-migrate')
+@with_appcontext
+def migrate_db_command():
+    """Apply any migrations the database is missing"""
+    applied = migrate_db()
+    for name in applied:
+        click.echo('Applied {0}'.format(name))
+    click.echo('Database is at version {0}'.format(len(list_migrations())))
+
+# REBUILD THE SEARCH INDEX
+"""
+The triggers in schema.sql keep post_fts in step with post, but rows that
+ were written before the index existed (or a damaged index) need a rebuild.
+FTS5's 'rebuild' command re-reads every row of the content table.
+"""
+def rebuild_search_index():
+    db = get_db()
+    db.execute(queries.REBUILD_SEARCH)
+    db.commit()
+    return db.execute(queries.COUNT_POSTS).fetchone()[0]
+
+@click.command('rebuild-search')
+@with_appcontext
+def rebuild_search_command():
+    """Rebuild the full-text search index from the post table"""
+    count = rebuild_search_index()
+    click.echo('Indexed {0} posts'.format(count))
+
+# CHECK THE POST COUNTERS
+"""
+user.post_count is maintained by triggers. This recounts every author's
+ posts in one GROUP BY pass over the post_author_created index and
+ reports (or with --fix, corrects) the counters that disagree.
+"""
+def check_post_counts(fix=False):
+    db = get_db()
+    wrong = db.execute(queries.WRONG_POST_COUNTS).fetchall()
+    if fix and wrong:
+        db.executemany(
+            queries.SET_POST_COUNT,
+            [(row['actual'], row['id']) for row in wrong]
+        )
+        db.commit()
+    return wrong
+
+@click.command('check-post-counts')
+@click.option('--fix', is_flag=True, help='Correct the counters that are off.')
+@with_appcontext
+def check_post_counts_command(fix):
+    """Recount every author's posts and compare with user.post_count"""
+    wrong = check_post_counts(fix)
+    for row in wrong:
+        click.echo('{0}: stored {1}, actual {2}'.format(
+            row['username'], row['post_count'], row['actual']))
+    if not wrong:
+        click.echo('All post counts are correct')
+    elif fix:
+        click.echo('Fixed {0} post counts'.format(len(wrong)))
+
 # REGISTER WITH THE APPLICATION
 """
 The close_db and init_db_command functions need to be registered with the 
@@ -86,4 +413,11 @@ Write a function that takes an application and does the registration.
 """
 def init_app(app):
     app.teardown_appcontext(close_db)
-    app.cli.add_command(init_db_command)
\ No newline at end of file
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_db_command)
+    app.cli.add_command(rebuild_search_command)
+    app.cli.add_command(check_post_counts_command)
+
+    # 'flask db-maintain', and the maintenance thread if MAINTENANCE_INTERVAL is set
+    from flaskr import maintenance
+    maintenance.init_app(app)
\ No newline at end of file
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# PASSWORD HASHING OFF THE REQUEST THREAD
+"""
+Password hashes are slow on purpose, which also makes them an easy way to
+ tie up every core with a burst of logins.
+
+1. HashingPool
+    Runs hashes on at most HASH_WORKERS threads. Werkzeug's hashes end up in
+    hashlib, which releases the GIL while it works, so other requests keep
+    being served. At most HASH_QUEUE_SIZE hashes may wait for a worker;
+    past that the request gets a 503 instead of piling up. A request that
+    waits longer than HASH_TIMEOUT seconds for its hash gets a 503 too.
+2. PASSWORD_HASH_METHOD
+    The method and cost passed to generate_password_hash, e.g.
+    'pbkdf2:sha256:600000'. None keeps Werkzeug's default.
+3. stats()
+    How many hashes ran, were rejected or timed out, and how long they took
+    on average, along with the method in use, so a cost change shows up in
+    the numbers.
+"""
+class HashingPool(object):
+    def __init__(self, workers, queue_size, timeout=None, method=None):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='flaskr-hash'
+        )
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.hashed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.seconds = 0.0
+
+    def _timed(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.hashed += 1
+                self.seconds += elapsed
+            self._slots.release()
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ServiceUnavailable('Too many logins in progress, try again.')
+        try:
+            future = self._executor.submit(self._timed, func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            # The hash still finishes on its worker and frees its slot then
+            with self._lock:
+                self.timed_out += 1
+            raise ServiceUnavailable('Logins are taking too long, try again.')
+
+    def generate(self, password):
+        if self.method is None:
+            return self.run(generate_password_hash, password)
+        return self.run(generate_password_hash, password, self.method)
+
+    def check(self, pwhash, password):
+        return self.run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'method': self.method or 'default',
+                'workers': self.workers,
+                'hashed': self.hashed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'avg_seconds': self.seconds / self.hashed if self.hashed else 0.0,
+            }
+
+# LOGIN THROTTLING
+"""
+A token bucket per key: each key may spend 'burst' attempts at once and
+ earns 'rate' attempts back per second. Auth views check one bucket per
+ username and one per client address before they hash anything.
+At most 'size' buckets are remembered; the least recently used goes first.
+"""
+class RateLimiter(object):
+    def __init__(self, rate, burst, size=10000):
+        self.rate = rate
+        self.burst = burst
+        self.size = size
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.size:
+                self._buckets.popitem(last=False)
+            return allowed
+
+_lock = threading.Lock()
+
+def get_hashing_pool(app=None):
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('flaskr_hashing_pool')
+    if pool is None:
+        with _lock:
+            pool = app.extensions.get('flaskr_hashing_pool')
+            if pool is None:
+                pool = app.extensions['flaskr_hashing_pool'] = HashingPool(
+                    app.config['HASH_WORKERS'],
+                    app.config['HASH_QUEUE_SIZE'],
+                    app.config['HASH_TIMEOUT'],
+                    app.config['PASSWORD_HASH_METHOD'],
+                )
+    return pool
+
+def get_login_limiter(app=None):
+    app = app or current_app._get_current_object()
+    limiter = app.extensions.get('flaskr_login_limiter')
+    if limiter is None:
+        with _lock:
+            limiter = app.extensions.get('flaskr_login_limiter')
+            if limiter is None:
+                limiter = app.extensions['flaskr_login_limiter'] = RateLimiter(
+                    app.config['LOGIN_RATE'], app.config['LOGIN_BURST']
+                )
+    return limiter
+
+def throttle(username, address):
+    limiter = get_login_limiter()
+    # Charge both buckets; either one running dry refuses the attempt
+    user_ok = limiter.allow(('user', username))
+    addr_ok = limiter.allow(('addr', address))
+    if not (user_ok and addr_ok):
+        raise TooManyRequests('Too many attempts, slow down.')
+
+def hash_password(password):
+    return get_hashing_pool().generate(password)
+
+def verify_password(pwhash, password):
+    return get_hashing_pool().check(pwhash, password)
+
+def hashing_stats():
+    return get_hashing_pool().stats()
@@ -0,0 +1,168 @@
+import sqlite3
+import threading
+import time
+
+from flask import (
+    abort, current_app, g, has_app_context, jsonify, request,
+    before_render_template, template_rendered
+)
+
+# SQL INSTRUMENTATION
+"""
+Connections handed out by get_db are InstrumentedConnections. They time
+ every execute, executemany and executescript and add the count and time
+ to the current app context (g), so each request knows how many queries it
+ ran and how long the database took.
+
+1. SLOW_QUERY_MS
+    Statements slower than this are logged as warnings together with their
+    EXPLAIN QUERY PLAN. None turns the slow query log off.
+2. What is timed
+    execute() runs the statement up to its first row, so the time of
+    fetching the remaining rows of a large SELECT is not included.
+"""
+class InstrumentedConnection(sqlite3.Connection):
+    def _timed(self, method, sql, *args):
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            if has_app_context():
+                g.sql_queries = g.get('sql_queries', 0) + 1
+                g.sql_seconds = g.get('sql_seconds', 0.0) + elapsed
+                threshold = current_app.config['SLOW_QUERY_MS']
+                if threshold is not None and elapsed * 1000 >= threshold:
+                    self._log_slow(sql, args, elapsed)
+
+    def _log_slow(self, sql, args, elapsed):
+        plan = ''
+        # executescript has no parameters and may hold many statements
+        if args:
+            params = args[0]
+            if not isinstance(params, (tuple, list, dict)):
+                # executemany: explain the first row's parameters
+                params = next(iter(params), ())
+            try:
+                rows = super().execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = '; '.join(row[-1] for row in rows)
+            except sqlite3.Error:
+                pass
+        current_app.logger.warning(
+            'Slow query (%.1f ms): %s [plan: %s]',
+            elapsed * 1000, ' '.join(sql.split()), plan or 'n/a'
+        )
+
+    def execute(self, sql, parameters=()):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self._timed(super().executemany, sql, parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(super().executescript, sql_script)
+
+# REQUEST TIMING
+"""
+Every response gets a Server-Timing header that splits the request into
+ db (time in SQL), render (time in Jinja) and total, which browser dev
+ tools show next to the request.
+The same numbers are added up per endpoint. With SQL_STATS_ENDPOINT on,
+ /_stats returns those totals as JSON.
+
+Streamed pages send their headers before the body is rendered, so their
+ Server-Timing only has what happened before that: db is the queries run
+ so far and total is the time to the headers; there is no render figure.
+Their per-endpoint totals are added when the body has been sent and the
+ response is closed, and include the rendering and queries done meanwhile.
+"""
+def start_request():
+    g.request_start = time.perf_counter()
+
+def start_render(sender, template, context, **extra):
+    if has_app_context():
+        g.render_start = time.perf_counter()
+
+def end_render(sender, template, context, **extra):
+    if has_app_context() and 'render_start' in g:
+        g.render_seconds = (
+            g.get('render_seconds', 0.0)
+            + time.perf_counter() - g.pop('render_start')
+        )
+
+def add_route_stats(app, endpoint, timings):
+    db, render, queries, total = timings
+    stats = app.extensions['flaskr_route_stats']
+    with stats['lock']:
+        route = stats['routes'].setdefault(endpoint or '<unknown>', {
+            'requests': 0, 'queries': 0,
+            'db_ms': 0.0, 'render_ms': 0.0, 'total_ms': 0.0,
+        })
+        route['requests'] += 1
+        route['queries'] += queries
+        route['db_ms'] += db * 1000
+        route['render_ms'] += render * 1000
+        route['total_ms'] += total * 1000
+
+def request_timings(timed):
+    return (
+        timed.get('sql_seconds', 0.0),
+        timed.get('render_seconds', 0.0),
+        timed.get('sql_queries', 0),
+        time.perf_counter() - timed.request_start,
+    )
+
+def record_request(response):
+    if 'request_start' not in g:
+        return response
+
+    db, render, queries, total = request_timings(g)
+
+    if current_app.config['SERVER_TIMING']:
+        timing = ['db;dur={0:.2f};desc="{1} queries"'.format(db * 1000, queries)]
+        if not response.is_streamed:
+            timing.append('render;dur={0:.2f}'.format(render * 1000))
+        timing.append('total;dur={0:.2f}'.format(total * 1000))
+        response.headers['Server-Timing'] = ', '.join(timing)
+
+    app = current_app._get_current_object()
+    if response.is_streamed:
+        # g outlives the request context, so it can still be read on close
+        timed = g._get_current_object()
+        endpoint = request.endpoint
+
+        def add_on_close():
+            # A response may be closed more than once (see compress.py)
+            if not timed.get('stats_added'):
+                timed.stats_added = True
+                add_route_stats(app, endpoint, request_timings(timed))
+        response.call_on_close(add_on_close)
+    else:
+        add_route_stats(app, request.endpoint, (db, render, queries, total))
+    return response
+
+def route_stats(app=None):
+    app = app or current_app._get_current_object()
+    stats = app.extensions['flaskr_route_stats']
+    with stats['lock']:
+        return {
+            endpoint: dict(route,
+                           avg_ms=route['total_ms'] / route['requests'],
+                           avg_queries=route['queries'] / route['requests'])
+            for endpoint, route in stats['routes'].items()
+        }
+
+def stats_view():
+    if not current_app.config['SQL_STATS_ENDPOINT']:
+        abort(404)
+    return jsonify(route_stats())
+
+def init_app(app):
+    app.extensions['flaskr_route_stats'] = {
+        'lock': threading.Lock(), 'routes': {}
+    }
+    app.before_request(start_request)
+    app.after_request(record_request)
+    before_render_template.connect(start_render, app)
+    template_rendered.connect(end_render, app)
+    app.add_url_rule('/_stats', 'sql_stats', stats_view)
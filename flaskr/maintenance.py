@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr.db import get_pool
+
+# DATABASE MAINTENANCE
+"""
+Deleting and editing posts leaves free pages in the database file and
+ shifts the data the query planner's statistics describe, and the WAL file
+ grows between checkpoints. maintain() tidies all of that up in one run:
+
+1. PRAGMA optimize
+    Re-analyzes the tables whose statistics have gone stale. Like ANALYZE
+    below it reads at most MAINTENANCE_ANALYSIS_LIMIT rows per index, so
+    it stays quick on a large database.
+2. ANALYZE
+    Refreshes the statistics of every table and index.
+3. PRAGMA incremental_vacuum
+    Hands free pages back to the file system, MAINTENANCE_VACUUM_PAGES at
+    a time, until the freelist is empty or the time budget is spent. The
+    write lock is let go between steps, so requests can write in between.
+    New databases use auto_vacuum = incremental (see DATABASE_PRAGMAS);
+    an older one is switched over once with
+    'flask db-maintain --enable-incremental-vacuum', which runs a VACUUM.
+4. PRAGMA wal_checkpoint
+    Copies the WAL back into the database. MAINTENANCE_CHECKPOINT picks
+    the mode: PASSIVE never waits for readers or writers, TRUNCATE also
+    shrinks the WAL file but has to wait for them.
+
+A run stops starting new steps once MAINTENANCE_BUDGET_MS is used up, and
+ its connection waits no longer than the budget for a lock, so a run never
+ holds up requests for long. The file size, freelist pages and WAL size
+ are measured before and after.
+
+'flask db-maintain' runs it once. With MAINTENANCE_INTERVAL set (seconds),
+ db.init_app also starts a thread that runs it on that schedule.
+"""
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def database_stats(db, path):
+    page_size = db.execute('PRAGMA page_size').fetchone()[0]
+    return {
+        'file_bytes': file_size(path),
+        'wal_bytes': file_size(path + '-wal'),
+        'pages': db.execute('PRAGMA page_count').fetchone()[0],
+        'freelist_pages': db.execute('PRAGMA freelist_count').fetchone()[0],
+        'page_size': page_size,
+    }
+
+def run_statement(db, sql):
+    db.execute(sql).fetchall()
+    return 'ok'
+
+def incremental_vacuum(db, pages, deadline):
+    if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        return 'auto_vacuum is not incremental'
+    start = free = db.execute('PRAGMA freelist_count').fetchone()[0]
+    while free and time.monotonic() < deadline:
+        # The pragma frees one page per step and execute() stops after the
+        # first one; executescript steps it to the end
+        db.executescript('PRAGMA incremental_vacuum({0:d})'.format(pages))
+        free = db.execute('PRAGMA freelist_count').fetchone()[0]
+    return 'freed {0} pages'.format(start - free)
+
+def checkpoint(db, mode):
+    if db.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+        return 'not in WAL mode'
+    busy, log, done = db.execute(
+        'PRAGMA wal_checkpoint({0})'.format(mode)
+    ).fetchone()
+    return '{0} of {1} frames{2}'.format(done, log, ' (busy)' if busy else '')
+
+def maintain(db, path, config, analyze=True, vacuum=True, mode=None):
+    budget = config['MAINTENANCE_BUDGET_MS'] / 1000.0
+    deadline = time.monotonic() + budget
+    mode = (mode or config['MAINTENANCE_CHECKPOINT']).upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError('Unknown checkpoint mode {0}.'.format(mode))
+
+    db.execute('PRAGMA busy_timeout = {0:d}'.format(int(budget * 1000)))
+    db.execute('PRAGMA analysis_limit = {0:d}'.format(
+        config['MAINTENANCE_ANALYSIS_LIMIT']))
+
+    steps = [('optimize', lambda: run_statement(db, 'PRAGMA optimize'))]
+    if analyze:
+        steps.append(('analyze', lambda: run_statement(db, 'ANALYZE')))
+    if vacuum:
+        steps.append(('incremental_vacuum', lambda: incremental_vacuum(
+            db, config['MAINTENANCE_VACUUM_PAGES'], deadline)))
+    steps.append(('wal_checkpoint', lambda: checkpoint(db, mode)))
+
+    report = {'before': database_stats(db, path), 'steps': []}
+    for name, run in steps:
+        if time.monotonic() >= deadline:
+            report['steps'].append((name, 'skipped, out of time', 0.0))
+            continue
+        start = time.perf_counter()
+        try:
+            result = run()
+        except Exception as e:
+            result = 'failed: {0}'.format(e)
+        report['steps'].append((name, result, time.perf_counter() - start))
+    report['after'] = database_stats(db, path)
+    return report
+
+def run_maintenance(app, **options):
+    db = get_pool(app).connect()
+    try:
+        return maintain(db, app.config['DATABASE'], app.config, **options)
+    finally:
+        db.close()
+
+def format_report(report):
+    lines = ['{0:20} {1}  ({2:.1f} ms)'.format(name, result, seconds * 1000)
+             for name, result, seconds in report['steps']]
+    lines.append('{0:20} {1:>14} {2:>14}'.format('', 'before', 'after'))
+    for key in ('file_bytes', 'wal_bytes', 'pages', 'freelist_pages'):
+        lines.append('{0:20} {1:14,d} {2:14,d}'.format(
+            key, report['before'][key], report['after'][key]))
+    return '\n'.join(lines)
+
+# THE BACKGROUND THREAD
+class Maintainer(object):
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self.runs = 0
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='flaskr-maintenance', daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                with self.app.app_context():
+                    report = run_maintenance(self.app)
+            except Exception:
+                self.app.logger.exception('Database maintenance failed')
+                continue
+            self.runs += 1
+            self.last_report = report
+            self.app.logger.info('Database maintenance\n%s', format_report(report))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+def start_maintenance(app):
+    maintainer = app.extensions.get('flaskr_maintenance')
+    if maintainer is None:
+        maintainer = app.extensions['flaskr_maintenance'] = Maintainer(
+            app, app.config['MAINTENANCE_INTERVAL']
+        )
+    return maintainer
+
+def stop_maintenance(app=None):
+    app = app or current_app._get_current_object()
+    maintainer = app.extensions.pop('flaskr_maintenance', None)
+    if maintainer is not None:
+        maintainer.close()
+
+@click.command('db-maintain')
+@click.option('--no-analyze', is_flag=True, help='Skip the full ANALYZE.')
+@click.option('--no-vacuum', is_flag=True, help='Skip the incremental vacuum.')
+@click.option('--checkpoint', 'mode', type=click.Choice(CHECKPOINT_MODES, case_sensitive=False),
+              help='WAL checkpoint mode (default MAINTENANCE_CHECKPOINT).')
+@click.option('--enable-incremental-vacuum', is_flag=True,
+              help='Switch an older database to auto_vacuum = incremental (runs VACUUM).')
+@with_appcontext
+def maintain_command(no_analyze, no_vacuum, mode, enable_incremental_vacuum):
+    """Optimize, analyze, vacuum and checkpoint the database"""
+    if enable_incremental_vacuum:
+        db = get_pool().connect()
+        try:
+            db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            db.execute('VACUUM')
+        finally:
+            db.close()
+        click.echo('auto_vacuum is now incremental')
+    report = run_maintenance(
+        current_app._get_current_object(),
+        analyze=not no_analyze, vacuum=not no_vacuum, mode=mode
+    )
+    click.echo(format_report(report))
+
+def init_app(app):
+    app.cli.add_command(maintain_command)
+    if app.config['MAINTENANCE_INTERVAL']:
+        start_maintenance(app)
@@ -0,0 +1,8 @@
+/*
+Indexes for the queries the blog runs on every page.
+post_created_id serves the index ordering and its (created, id) cursor,
+  post_author_created serves lookups of an author's posts.
+*/
+
+CREATE INDEX IF NOT EXISTS post_created_id ON post (created, id);
+CREATE INDEX IF NOT EXISTS post_author_created ON post (author_id, created, id);
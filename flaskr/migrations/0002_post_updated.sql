@@ -0,0 +1,24 @@
+/*
+Add post.updated. ALTER TABLE can't add a column whose default is
+  CURRENT_TIMESTAMP, so the table is rebuilt and the rows copied over,
+  with updated starting out equal to created.
+*/
+
+CREATE TABLE post_new (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  title TEXT NOT NULL,
+  body TEXT NOT NULL,
+  FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+INSERT INTO post_new (id, author_id, created, updated, title, body)
+SELECT id, author_id, created, created, title, body FROM post;
+
+DROP TABLE post;
+ALTER TABLE post_new RENAME TO post;
+
+CREATE INDEX post_created_id ON post (created, id);
+CREATE INDEX post_author_created ON post (author_id, created, id);
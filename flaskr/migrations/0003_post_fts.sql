@@ -0,0 +1,27 @@
+/*
+Full-text search over posts, see schema.sql. The index is filled from the
+  existing rows once the triggers are in place.
+*/
+
+CREATE VIRTUAL TABLE post_fts USING fts5(
+  title, body, content='post', content_rowid='id'
+);
+
+CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN
+  INSERT INTO post_fts (rowid, title, body)
+  VALUES (new.id, new.title, new.body);
+END;
+
+CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN
+  INSERT INTO post_fts (post_fts, rowid, title, body)
+  VALUES ('delete', old.id, old.title, old.body);
+END;
+
+CREATE TRIGGER post_fts_update AFTER UPDATE OF title, body ON post BEGIN
+  INSERT INTO post_fts (post_fts, rowid, title, body)
+  VALUES ('delete', old.id, old.title, old.body);
+  INSERT INTO post_fts (rowid, title, body)
+  VALUES (new.id, new.title, new.body);
+END;
+
+INSERT INTO post_fts (post_fts) VALUES ('rebuild');
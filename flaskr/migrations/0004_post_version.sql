@@ -0,0 +1,25 @@
+/*
+The post_version row behind the ETag and Last-Modified headers, see
+  schema.sql.
+*/
+
+CREATE TABLE post_version (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  version INTEGER NOT NULL,
+  modified TIMESTAMP NOT NULL
+);
+
+INSERT INTO post_version (id, version, modified)
+VALUES (1, 0, CURRENT_TIMESTAMP);
+
+CREATE TRIGGER post_version_insert AFTER INSERT ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_version_update AFTER UPDATE ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_version_delete AFTER DELETE ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
@@ -0,0 +1,8 @@
+/*
+Columns for the rendered body, see render.py. Existing rows start with
+  render_version 0 and are rendered by 'flask render-posts'.
+*/
+
+ALTER TABLE post ADD COLUMN body_html TEXT NOT NULL DEFAULT '';
+ALTER TABLE post ADD COLUMN excerpt TEXT NOT NULL DEFAULT '';
+ALTER TABLE post ADD COLUMN render_version INTEGER NOT NULL DEFAULT 0;
@@ -0,0 +1,25 @@
+/*
+A per-author post counter kept up to date by triggers, see schema.sql.
+  It starts out counted from the existing posts.
+*/
+
+ALTER TABLE user ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE user SET post_count = (
+  SELECT COUNT(*) FROM post WHERE post.author_id = user.id
+);
+
+-- Each author's number of posts, so author pages never run COUNT(*)
+CREATE TRIGGER post_count_insert AFTER INSERT ON post BEGIN
+  UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
+
+CREATE TRIGGER post_count_delete AFTER DELETE ON post BEGIN
+  UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+END;
+
+CREATE TRIGGER post_count_update AFTER UPDATE OF author_id ON post
+WHEN new.author_id != old.author_id BEGIN
+  UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+  UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
@@ -0,0 +1,172 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import time
+from urllib.parse import parse_qs
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+# PER-REQUEST PROFILING
+"""
+A slow request can be run once under cProfile to see whether its time goes
+ to SQL, Jinja, password hashing or the view itself.
+
+1. PROFILER
+    Off by default. While it is off the middleware only checks this flag
+    and hands the request on, so it costs next to nothing.
+2. Asking for a profile
+    With PROFILER on, a request is profiled only when it carries a token
+    from 'flask profile-token', either as an X-Profile header or as a
+    _profile query parameter. Tokens are signed with SECRET_KEY and expire
+    after PROFILE_TOKEN_MAX_AGE seconds, so visitors can't turn profiling
+    on for themselves.
+3. What is profiled
+    The whole WSGI call, including sending a streamed body, since a
+    streamed page does most of its work after the view has returned.
+    cProfile only sees the thread that handles the request.
+4. Output
+    One pstats file per request under PROFILE_DIR (instance/profiles by
+    default). The response names it in an X-Profile-File header.
+    'flask profile-list' lists the files and 'flask profile-show' prints
+    the top functions of one; they also open in snakeviz or gprof2dot.
+"""
+TOKEN_SALT = 'flaskr-profile'
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile'
+
+def serializer(app):
+    return URLSafeTimedSerializer(app.secret_key, salt=TOKEN_SALT)
+
+def profile_dir(app):
+    return app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+
+def profile_name(environ):
+    path = re.sub(r'[^A-Za-z0-9]+', '-', environ.get('PATH_INFO', '')).strip('-')
+    return '{0}-{1:03d}-{2}-{3}.prof'.format(
+        time.strftime('%Y%m%d-%H%M%S'), int(time.time() * 1000) % 1000,
+        environ.get('REQUEST_METHOD', 'GET'), path or 'index'
+    )
+
+class ProfilerMiddleware(object):
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not self.app.config['PROFILER'] or not self.requested(environ):
+            return self.wsgi_app(environ, start_response)
+        return self.profile(environ, start_response)
+
+    def requested(self, environ):
+        token = environ.get(HEADER)
+        if token is None:
+            query = parse_qs(environ.get('QUERY_STRING', ''))
+            token = query.get(QUERY_FLAG, [None])[0]
+        if not token:
+            return False
+        try:
+            serializer(self.app).loads(
+                token, max_age=self.app.config['PROFILE_TOKEN_MAX_AGE']
+            )
+        except BadSignature:
+            return False
+        return True
+
+    def profile(self, environ, start_response):
+        folder = profile_dir(self.app)
+        os.makedirs(folder, exist_ok=True)
+        name = profile_name(environ)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            return start_response(
+                status, headers + [('X-Profile-File', name)], exc_info
+            )
+
+        profiler = cProfile.Profile()
+        body = profiler.runcall(self.wsgi_app, environ, profiled_start_response)
+        return ProfiledBody(body, profiler, os.path.join(folder, name))
+
+# The profiler is switched on again for every chunk the server pulls
+class ProfiledBody(object):
+    def __init__(self, body, profiler, path):
+        self.body = body
+        self.profiler = profiler
+        self.path = path
+
+    def __iter__(self):
+        chunks = iter(self.body)
+        while True:
+            self.profiler.enable()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                self.profiler.disable()
+            yield chunk
+
+    def close(self):
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                self.profiler.runcall(close)
+        finally:
+            self.profiler.dump_stats(self.path)
+
+def list_profiles(app):
+    folder = profile_dir(app)
+    if not os.path.isdir(folder):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith('.prof'):
+            stats = pstats.Stats(os.path.join(folder, name))
+            profiles.append((name, stats.total_tt, stats.total_calls))
+    return profiles
+
+def summarize(path, sort='cumulative', limit=25):
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token_command():
+    """Print a token that turns on profiling for a request"""
+    click.echo(serializer(current_app).dumps('profile'))
+    click.echo('Send it as an X-Profile header or a _profile query parameter.')
+
+@click.command('profile-list')
+@with_appcontext
+def profile_list_command():
+    """List the saved request profiles"""
+    profiles = list_profiles(current_app)
+    if not profiles:
+        click.echo('No profiles in {0}.'.format(profile_dir(current_app)))
+    for name, seconds, calls in profiles:
+        click.echo('{0:60} {1:9.1f} ms {2:9} calls'.format(name, seconds * 1000, calls))
+
+@click.command('profile-show')
+@click.argument('name')
+@click.option('--sort', default='cumulative',
+              help='pstats sort key, e.g. cumulative, tottime, calls.')
+@click.option('--limit', default=25, help='How many functions to show.')
+@with_appcontext
+def profile_show_command(name, sort, limit):
+    """Print the top functions of one saved profile"""
+    path = os.path.join(profile_dir(current_app), os.path.basename(name))
+    if not os.path.exists(path):
+        raise click.ClickException('No profile named {0}.'.format(name))
+    click.echo(summarize(path, sort, limit))
+
+def init_app(app):
+    app.wsgi_app = ProfilerMiddleware(app, app.wsgi_app)
+    app.cli.add_command(profile_token_command)
+    app.cli.add_command(profile_list_command)
+    app.cli.add_command(profile_show_command)
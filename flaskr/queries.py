@@ -0,0 +1,212 @@
+import functools
+
+# THE QUERIES
+"""
+Every SQL statement the views and commands run against the tables is
+ written here, once, instead of inline where it is used.
+
+1. One text per statement
+    Each connection keeps its compiled statements in a cache keyed on the
+    exact SQL text (DATABASE_CACHED_STATEMENTS entries per connection).
+    Statements are plain constants with ? placeholders, so every call
+    sends the same text and reuses the compiled statement instead of
+    preparing it again. Statements whose select list varies (the API's
+    fields=) come from memoized builders, so the same arguments always
+    give back the very same string.
+2. QUERIES
+    Every statement is registered by name with example parameters.
+    tests/test_queries.py runs EXPLAIN QUERY PLAN on each of them and fails
+    on any SCAN of post or user, except a walk along an index that a LIMIT
+    stops early. The batch commands that read every row on purpose are
+    registered with full_scan=True.
+
+PRAGMAs, the schema and migrations, and the writer's transaction
+ statements stay in their modules.
+"""
+QUERIES = {}
+
+def register(name, sql, example=(), full_scan=False):
+    QUERIES[name] = (sql, example, full_scan)
+    return sql
+
+## USERS
+USER_BY_ID = register(
+    'user_by_id',
+    'SELECT id, username FROM user WHERE id = ?',
+    (1,)
+)
+# Registering, logging in and importing all look a user up by name
+USER_BY_USERNAME = register(
+    'user_by_username',
+    'SELECT id, username, password FROM user WHERE username = ?',
+    ('test',)
+)
+AUTHOR_BY_USERNAME = register(
+    'author_by_username',
+    'SELECT id, username, post_count FROM user WHERE username = ?',
+    ('test',)
+)
+INSERT_USER = register(
+    'insert_user',
+    'INSERT INTO user (username, password) VALUES (?, ?)',
+    ('new', '!')
+)
+
+## POSTS
+POST_FROM = ' FROM post p JOIN user u ON p.author_id = u.id'
+
+# Rows that haven't been rendered yet (render_version 0) show their body
+EXCERPT_COLUMN = 'CASE WHEN render_version > 0 THEN excerpt ELSE body END'
+# The date under each title comes formatted from SQLite, so listing a page
+# doesn't call strftime (or even parse 'created') once per post
+DAY_COLUMN = 'date(created) AS created_day'
+INDEX_COLUMNS = (
+    'p.id, title, created, author_id, username, '
+    + EXCERPT_COLUMN + ' AS excerpt, ' + DAY_COLUMN
+)
+POST_COLUMNS = (
+    'p.id, title, body, body_html, render_version,'
+    ' created, updated, author_id, username'
+)
+
+"""
+index_page is one page of the keyset walk through post_created_id (or
+ post_author_created with by_author). 'direction' is None for the first
+ page, 'before' for older posts and 'after' for newer ones.
+The parameters are the author id (with by_author), the cursor's
+ (created, id) (with a direction) and the LIMIT.
+"""
+@functools.lru_cache(maxsize=256)
+def index_page(columns=INDEX_COLUMNS, by_author=False, direction=None):
+    where = ['author_id = ?'] if by_author else []
+    order = 'DESC'
+    if direction == 'before':
+        where.append('(created, p.id) < (?, ?)')
+    elif direction == 'after':
+        where.append('(created, p.id) > (?, ?)')
+        order = 'ASC'
+    return (
+        'SELECT ' + columns + POST_FROM +
+        (' WHERE ' + ' AND '.join(where) if where else '') +
+        ' ORDER BY created {0}, p.id {0} LIMIT ?'.format(order)
+    )
+
+def register_index_pages():
+    for by_author in (False, True):
+        for direction in (None, 'before', 'after'):
+            register(
+                'index_page{0}{1}'.format(
+                    '_by_author' if by_author else '',
+                    '_' + direction if direction else ''),
+                index_page(INDEX_COLUMNS, by_author, direction),
+                ((1,) if by_author else ())
+                + (('2018-01-01 00:00:00', 1) if direction else ()) + (21,)
+            )
+
+register_index_pages()
+
+@functools.lru_cache(maxsize=256)
+def post_by_id(columns=POST_COLUMNS):
+    return 'SELECT ' + columns + POST_FROM + ' WHERE p.id = ?'
+
+register('post_by_id', post_by_id(), (1,))
+
+POST_VERSION = register(
+    'post_version',
+    'SELECT version, modified FROM post_version WHERE id = 1'
+)
+
+FEED = register(
+    'feed',
+    'SELECT p.id, title, created, updated, username,'
+    ' CASE WHEN render_version > 0 THEN body_html ELSE body END AS content,'
+    ' render_version' + POST_FROM +
+    ' ORDER BY created DESC, p.id DESC LIMIT ?',
+    (20,)
+)
+
+# Parameters: snippet start, end and ellipsis, the MATCH query, LIMIT, OFFSET
+SEARCH = register(
+    'search',
+    'SELECT p.id, p.title, created, author_id, username, ' + DAY_COLUMN + ','
+    ' snippet(post_fts, 1, ?, ?, ?, 16) AS snippet'
+    ' FROM post_fts'
+    ' JOIN post p ON p.id = post_fts.rowid'
+    ' JOIN user u ON p.author_id = u.id'
+    ' WHERE post_fts MATCH ?'
+    ' ORDER BY bm25(post_fts, 10.0, 1.0)'
+    ' LIMIT ? OFFSET ?',
+    ('[', ']', '...', '"test"', 21, 0)
+)
+
+INSERT_POST = register(
+    'insert_post',
+    'INSERT INTO post (title, body, author_id,'
+    ' body_html, excerpt, render_version)'
+    ' VALUES (?, ?, ?, ?, ?, ?)',
+    ('title', 'body', 1, '<p>body</p>', 'body', 1)
+)
+UPDATE_POST = register(
+    'update_post',
+    'UPDATE post SET title = ?, body = ?,'
+    ' body_html = ?, excerpt = ?, render_version = ?,'
+    # Milliseconds, so two edits in one second get two ETags
+    " updated = strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    ' WHERE id = ?',
+    ('title', 'body', '<p>body</p>', 'body', 1, 1)
+)
+DELETE_POST = register(
+    'delete_post',
+    'DELETE FROM post WHERE id = ?',
+    (1,)
+)
+
+## BATCH COMMANDS
+EXPORT_POSTS = register(
+    'export_posts',
+    'SELECT title, body, created, username' + POST_FROM + ' ORDER BY p.id',
+    full_scan=True
+)
+IMPORT_POST = register(
+    'import_post',
+    'INSERT INTO post (title, body, author_id, created,'
+    ' body_html, excerpt, render_version)'
+    ' VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?, ?, ?)',
+    ('title', 'body', 1, None, '<p>body</p>', 'body', 1)
+)
+RENDER_BATCH = register(
+    'render_batch',
+    'SELECT id, body FROM post'
+    ' WHERE id > ? AND render_version < ?'
+    ' ORDER BY id LIMIT ?',
+    (0, 1, 500)
+)
+UPDATE_RENDERED = register(
+    'update_rendered',
+    'UPDATE post SET body_html = ?, excerpt = ?, render_version = ?'
+    ' WHERE id = ?',
+    ('<p>body</p>', 'body', 1, 1)
+)
+COUNT_POSTS = register(
+    'count_posts',
+    'SELECT COUNT(*) FROM post',
+    full_scan=True
+)
+REBUILD_SEARCH = register(
+    'rebuild_search',
+    "INSERT INTO post_fts (post_fts) VALUES ('rebuild')"
+)
+WRONG_POST_COUNTS = register(
+    'wrong_post_counts',
+    'SELECT u.id, u.username, u.post_count, COALESCE(c.n, 0) AS actual'
+    ' FROM user u LEFT JOIN ('
+    '  SELECT author_id, COUNT(*) AS n FROM post GROUP BY author_id'
+    ' ) c ON c.author_id = u.id'
+    ' WHERE u.post_count != COALESCE(c.n, 0)',
+    full_scan=True
+)
+SET_POST_COUNT = register(
+    'set_post_count',
+    'UPDATE user SET post_count = ? WHERE id = ?',
+    (1, 1)
+)
@@ -0,0 +1,174 @@
+import re
+from html import unescape
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from markupsafe import escape
+
+from flaskr import queries
+from flaskr.db import get_db
+
+# RENDERING POST BODIES
+"""
+Post bodies are written in a small subset of Markdown. They are rendered
+ once, when the post is saved, and the HTML is stored next to the body in
+ post.body_html together with a short plain text excerpt for the index.
+Pages then print the stored HTML instead of rendering on every request.
+
+1. Sanitizing
+    The body is HTML-escaped before any Markdown is applied, so the only
+    tags in the output are the ones the renderer itself writes. Links are
+    only made for http(s), relative and #fragment URLs.
+2. The subset
+    '#' headings, paragraphs, '-'/'*' and '1.' lists, '>' quotes, ``` code
+    blocks, and inline `code`, **strong**, *emphasis* and [links](url).
+3. RENDERER_VERSION
+    Stored with every rendered row. Bump it whenever the output changes and
+    run 'flask render-posts' to bring the stored HTML up to date.
+4. Bounded work
+    Any logged in user can save any body, so rendering must stay cheap on
+    hostile input. The inline patterns never backtrack past the next '*',
+    which keeps them linear, and quotes nest at most MAX_QUOTE_DEPTH deep;
+    a deeper '>' is left as text.
+"""
+RENDERER_VERSION = 2
+MAX_QUOTE_DEPTH = 8
+
+_INLINE = (
+    (re.compile(r'\*\*(.+?)\*\*'), r'<strong>\1</strong>'),
+    (re.compile(r'(?<![\w*])\*([^\s*](?:[^*]*[^\s*])?)\*(?![\w*])'), r'<em>\1</em>'),
+    (re.compile(r'\[([^\]]+)\]\(((?:https?://|/|#)[^)\s]*)\)'), r'<a href="\2">\1</a>'),
+)
+_CODE = re.compile(r'`([^`]+)`')
+_HEADING = re.compile(r'^(#{1,6})\s+(.*)$')
+_BULLET = re.compile(r'^[-*]\s+(.*)$')
+_NUMBERED = re.compile(r'^\d+\.\s+(.*)$')
+_TAGS = re.compile(r'<[^>]+>')
+
+def render_inline(text):
+    # Code spans are cut out first so nothing inside them is formatted
+    parts = _CODE.split(str(escape(text)))
+    for i in range(0, len(parts), 2):
+        for pattern, replacement in _INLINE:
+            parts[i] = pattern.sub(replacement, parts[i])
+    for i in range(1, len(parts), 2):
+        parts[i] = '<code>{0}</code>'.format(parts[i])
+    return ''.join(parts)
+
+def render_markdown(body, depth=0):
+    html = []
+    paragraph = []
+    items, list_tag = [], None
+    quote = []
+    lines = body.replace('\r\n', '\n').split('\n')
+
+    def flush():
+        nonlocal list_tag
+        if paragraph:
+            html.append('<p>{0}</p>'.format(
+                '<br>\n'.join(render_inline(line) for line in paragraph)))
+            del paragraph[:]
+        if items:
+            html.append('<{0}>{1}</{0}>'.format(list_tag, ''.join(
+                '<li>{0}</li>'.format(render_inline(item)) for item in items)))
+            del items[:]
+            list_tag = None
+        if quote:
+            html.append('<blockquote>{0}</blockquote>'.format(
+                render_markdown('\n'.join(quote), depth + 1)))
+            del quote[:]
+
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if stripped.startswith('```'):
+            flush()
+            code = []
+            i += 1
+            while i < len(lines) and not lines[i].strip().startswith('```'):
+                code.append(lines[i])
+                i += 1
+            html.append('<pre><code>{0}</code></pre>'.format(
+                escape('\n'.join(code))))
+        elif not stripped:
+            flush()
+        elif _HEADING.match(stripped):
+            flush()
+            marks, text = _HEADING.match(stripped).groups()
+            html.append('<h{0}>{1}</h{0}>'.format(len(marks), render_inline(text)))
+        elif stripped.startswith('>') and depth < MAX_QUOTE_DEPTH:
+            if not quote:
+                flush()
+            quote.append(stripped[1:].lstrip())
+        elif _BULLET.match(stripped) or _NUMBERED.match(stripped):
+            tag = 'ul' if _BULLET.match(stripped) else 'ol'
+            if paragraph or quote or (items and tag != list_tag):
+                flush()
+            list_tag = tag
+            items.append((_BULLET.match(stripped) or _NUMBERED.match(stripped)).group(1))
+        else:
+            if items or quote:
+                flush()
+            paragraph.append(stripped)
+        i += 1
+    flush()
+    return '\n'.join(html)
+
+def make_excerpt(body_html, length=280):
+    # Block ends become line breaks, everything else is plain text
+    text = re.sub(r'</(p|h\d|li|pre|blockquote)>|<br>', '\n', body_html)
+    text = unescape(_TAGS.sub('', text))
+    text = '\n'.join(line for line in text.split('\n') if line.strip())
+    if len(text) <= length:
+        return text
+    # Cut at the last whole word that fits
+    return text[:length + 1].rsplit(None, 1)[0][:length].rstrip() + '…'
+
+def render_post(body, excerpt_length=280):
+    """Return the (body_html, excerpt, render_version) to store for a body"""
+    body_html = render_markdown(body)
+    return body_html, make_excerpt(body_html, excerpt_length), RENDERER_VERSION
+
+# RE-RENDERING STORED POSTS
+"""
+Walks the posts in id order, --batch-size at a time, and re-renders the
+ ones whose render_version is behind RENDERER_VERSION (or every post with
+ --all). Each batch is one executemany and one commit, so the site keeps
+ serving while it runs.
+"""
+def render_posts(batch_size=500, everything=False):
+    db = get_db()
+    length = current_app.config['EXCERPT_LENGTH']
+    below = RENDERER_VERSION + 1 if everything else RENDERER_VERSION
+    last_id = 0
+    count = 0
+    while True:
+        rows = db.execute(
+            queries.RENDER_BATCH, (last_id, below, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        db.executemany(
+            queries.UPDATE_RENDERED,
+            [render_post(row['body'], length) + (row['id'],) for row in rows]
+        )
+        db.commit()
+        last_id = rows[-1]['id']
+        count += len(rows)
+    return count
+
+@click.command('render-posts')
+@click.option('--batch-size', type=int, default=500)
+@click.option('--all', 'everything', is_flag=True,
+              help='Re-render posts that are already up to date too.')
+@with_appcontext
+def render_posts_command(batch_size, everything):
+    """Re-render stored post HTML after the renderer changed"""
+    count = render_posts(batch_size, everything)
+    click.echo('Rendered {0} posts (renderer version {1})'.format(
+        count, RENDERER_VERSION))
+
+def init_app(app):
+    app.cli.add_command(render_posts_command)
@@ -3,21 +3,100 @@ In SQLite, data is stored in tables and columns. These should be created
   before you can store and retrieve data.
 This file will be used to create the SQL commands needed to create empty
   tables
+It always describes the latest schema. Databases that already hold data
+  are brought up to it by the files in migrations/ instead (flask db-migrate),
+  so every change here needs a matching migration.
 */
 
 DROP TABLE IF EXISTS user;
 DROP TABLE IF EXISTS post;
+DROP TABLE IF EXISTS post_fts;
+DROP TABLE IF EXISTS post_version;
 
 CREATE TABLE user (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   username TEXT UNIQUE NOT NULL,
-  password TEXT NOT NULL);
+  password TEXT NOT NULL,
+  -- kept up to date by the post_count triggers below
+  post_count INTEGER NOT NULL DEFAULT 0);
 
 CREATE TABLE post (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   author_id INTEGER NOT NULL,
   created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  updated TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
   title TEXT NOT NULL,
   body TEXT NOT NULL,
+  -- body rendered to HTML on write, see render.py
+  body_html TEXT NOT NULL DEFAULT '',
+  excerpt TEXT NOT NULL DEFAULT '',
+  render_version INTEGER NOT NULL DEFAULT 0,
   FOREIGN KEY (author_id) REFERENCES user (id)
 );
+
+-- Serves the index ordering and its (created, id) keyset cursor
+CREATE INDEX post_created_id ON post (created, id);
+-- Serves lookups of one author's posts, newest first
+CREATE INDEX post_author_created ON post (author_id, created, id);
+
+-- Full-text index over post titles and bodies.
+-- It is an external content table: the text lives in post only and the
+-- triggers below keep the index in step with every insert, update and delete.
+CREATE VIRTUAL TABLE post_fts USING fts5(
+  title, body, content='post', content_rowid='id'
+);
+
+CREATE TRIGGER post_fts_insert AFTER INSERT ON post BEGIN
+  INSERT INTO post_fts (rowid, title, body)
+  VALUES (new.id, new.title, new.body);
+END;
+
+CREATE TRIGGER post_fts_delete AFTER DELETE ON post BEGIN
+  INSERT INTO post_fts (post_fts, rowid, title, body)
+  VALUES ('delete', old.id, old.title, old.body);
+END;
+
+CREATE TRIGGER post_fts_update AFTER UPDATE OF title, body ON post BEGIN
+  INSERT INTO post_fts (post_fts, rowid, title, body)
+  VALUES ('delete', old.id, old.title, old.body);
+  INSERT INTO post_fts (rowid, title, body)
+  VALUES (new.id, new.title, new.body);
+END;
+
+-- A single row that changes whenever any post does. Views build their
+-- ETag and Last-Modified headers from it without reading the posts.
+CREATE TABLE post_version (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  version INTEGER NOT NULL,
+  modified TIMESTAMP NOT NULL
+);
+
+INSERT INTO post_version (id, version, modified)
+VALUES (1, 0, CURRENT_TIMESTAMP);
+
+CREATE TRIGGER post_version_insert AFTER INSERT ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_version_update AFTER UPDATE ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+CREATE TRIGGER post_version_delete AFTER DELETE ON post BEGIN
+  UPDATE post_version SET version = version + 1, modified = CURRENT_TIMESTAMP;
+END;
+
+-- Each author's number of posts, so author pages never run COUNT(*)
+CREATE TRIGGER post_count_insert AFTER INSERT ON post BEGIN
+  UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
+
+CREATE TRIGGER post_count_delete AFTER DELETE ON post BEGIN
+  UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+END;
+
+CREATE TRIGGER post_count_update AFTER UPDATE OF author_id ON post
+WHEN new.author_id != old.author_id BEGIN
+  UPDATE user SET post_count = post_count - 1 WHERE id = old.author_id;
+  UPDATE user SET post_count = post_count + 1 WHERE id = new.author_id;
+END;
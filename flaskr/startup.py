@@ -0,0 +1,108 @@
+import os
+import time
+from contextlib import contextmanager
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from jinja2 import FileSystemBytecodeCache
+
+# COLD START
+"""
+A new worker pays for importing and registering every module and for
+ compiling each template the first time it is used.
+
+1. StartupTimer
+    create_app runs each of its steps inside timer.step(name), which
+    records how long the step (including its imports) took. The time to
+    the first response is added once the first request is done and logged.
+    'flask startup-report' prints the numbers.
+2. JINJA_BYTECODE_CACHE
+    Compiled templates are stored under JINJA_CACHE_DIR (instance/
+    jinja_cache by default), so a new worker loads them instead of
+    compiling them again.
+    'flask compile-templates' fills the cache ahead of time, e.g. as a
+    deploy step.
+"""
+class StartupTimer(object):
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+        self.ready = None
+        self.first_request = None
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def finish(self):
+        self.ready = time.perf_counter() - self.started
+
+    def report(self):
+        lines = ['{0:24} {1:8.1f} ms'.format(name, seconds * 1000)
+                 for name, seconds in self.steps]
+        lines.append('{0:24} {1:8.1f} ms'.format('create_app total', self.ready * 1000))
+        if self.first_request is not None:
+            lines.append('{0:24} {1:8.1f} ms'.format(
+                'first response', self.first_request * 1000))
+        return '\n'.join(lines)
+
+def record_first_request(response):
+    timer = current_app.extensions['flaskr_startup']
+    if timer.first_request is None:
+        timer.first_request = time.perf_counter() - timer.started
+        current_app.logger.info(
+            'First response %.1f ms after create_app started',
+            timer.first_request * 1000
+        )
+    return response
+
+def init_jinja_cache(app):
+    if not app.config['JINJA_BYTECODE_CACHE']:
+        return
+    folder = app.config['JINJA_CACHE_DIR'] or os.path.join(
+        app.instance_path, 'jinja_cache'
+    )
+    os.makedirs(folder, exist_ok=True)
+    # Must be set before app.jinja_env is first used, which creates it
+    app.jinja_options = dict(
+        app.jinja_options, bytecode_cache=FileSystemBytecodeCache(folder)
+    )
+
+def compile_templates():
+    env = current_app.jinja_env
+    timings = []
+    for name in env.list_templates(extensions=('html', 'xml')):
+        start = time.perf_counter()
+        env.get_template(name)
+        timings.append((name, time.perf_counter() - start))
+    return timings
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+    """Compile every template into the Jinja bytecode cache"""
+    if not current_app.config['JINJA_BYTECODE_CACHE']:
+        raise click.ClickException('JINJA_BYTECODE_CACHE is turned off.')
+    timings = compile_templates()
+    click.echo('Compiled {0} templates in {1:.1f} ms'.format(
+        len(timings), sum(t for n, t in timings) * 1000))
+
+@click.command('startup-report')
+@with_appcontext
+def startup_report_command():
+    """Show how long create_app and the first template loads take"""
+    click.echo(current_app.extensions['flaskr_startup'].report())
+    for name, seconds in compile_templates():
+        click.echo('{0:24} {1:8.1f} ms'.format('load ' + name, seconds * 1000))
+
+def init_app(app, timer):
+    app.extensions['flaskr_startup'] = timer
+    app.after_request(record_first_request)
+    init_jinja_cache(app)
+    app.cli.add_command(compile_templates_command)
+    app.cli.add_command(startup_report_command)
@@ -0,0 +1,137 @@
+import csv
+import json
+import time
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from flaskr import queries
+from flaskr.db import get_db
+from flaskr.render import render_post
+
+# BULK IMPORT AND EXPORT OF POSTS
+"""
+Posts move in and out as JSON lines (one object per line) or CSV with the
+ columns title, body, created and username.
+Both commands stream: export walks the cursor row by row instead of calling
+ fetchall(), and import reads the file in batches of --batch-size rows, so
+ memory use stays flat however many posts there are.
+
+1. Authors
+    Posts refer to their author by username. Import looks each one up once
+    and creates the users it can't find. A created user gets the password
+    '!', which no password hash ever matches, so nobody can log in as them
+    until the password is set.
+2. Transactions
+    Every batch is inserted with one executemany and one commit.
+3. Rendering
+    Imported bodies are rendered to HTML on the way in, like posts saved
+    through the site.
+"""
+FIELDS = ('title', 'body', 'created', 'username')
+
+def guess_format(filename, fmt):
+    if fmt is not None:
+        return fmt
+    return 'csv' if filename.endswith('.csv') else 'jsonl'
+
+def export_posts(out, fmt='jsonl'):
+    cursor = get_db().execute(queries.EXPORT_POSTS)
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+    count = 0
+    for row in cursor:
+        values = (row['title'], row['body'], str(row['created']), row['username'])
+        if fmt == 'csv':
+            writer.writerow(values)
+        else:
+            out.write(json.dumps(dict(zip(FIELDS, values))) + '\n')
+        count += 1
+    return count
+
+def read_posts(infile, fmt='jsonl'):
+    if fmt == 'csv':
+        for row in csv.DictReader(infile):
+            yield row
+    else:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
+
+def import_posts(rows, batch_size=500):
+    db = get_db()
+    length = current_app.config['EXCERPT_LENGTH']
+    authors = {}
+
+    def author_id(username):
+        if username not in authors:
+            row = db.execute(queries.USER_BY_USERNAME, (username,)).fetchone()
+            if row is None:
+                authors[username] = db.execute(
+                    queries.INSERT_USER, (username, '!')
+                ).lastrowid
+            else:
+                authors[username] = row['id']
+        return authors[username]
+
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        db.executemany(
+            queries.IMPORT_POST,
+            [
+                (row['title'], row.get('body') or '',
+                 author_id(row['username']), row.get('created') or None)
+                + render_post(row.get('body') or '', length)
+                for row in batch
+            ]
+        )
+        db.commit()
+        count += len(batch)
+    return count
+
+def report(verb, count, start):
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0
+    click.echo(
+        '{0} {1} posts in {2:.2f}s ({3:.0f} posts/s)'.format(
+            verb, count, elapsed, rate),
+        err=True
+    )
+
+@click.command('export-posts')
+@click.argument('output', type=click.File('w', lazy=True))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']),
+              help='Defaults to csv for *.csv files, jsonl otherwise.')
+@with_appcontext
+def export_posts_command(output, fmt):
+    """Stream every post to OUTPUT ('-' for stdout)"""
+    start = time.perf_counter()
+    count = export_posts(output, guess_format(output.name, fmt))
+    report('Exported', count, start)
+
+@click.command('import-posts')
+@click.argument('input', type=click.File('r'))
+@click.option('--format', 'fmt', type=click.Choice(['jsonl', 'csv']),
+              help='Defaults to csv for *.csv files, jsonl otherwise.')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows per transaction (IMPORT_BATCH_SIZE).')
+@with_appcontext
+def import_posts_command(input, fmt, batch_size):
+    """Stream posts from INPUT ('-' for stdin) into the database"""
+    start = time.perf_counter()
+    count = import_posts(
+        read_posts(input, guess_format(input.name, fmt)),
+        batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    )
+    report('Imported', count, start)
+
+def init_app(app):
+    app.cli.add_command(export_posts_command)
+    app.cli.add_command(import_posts_command)
@@ -14,36 +14,82 @@ The purpose of fixtures is to provide a fixed baseline upon which tests can reli
 """
 
 import os
+import sqlite3
 import tempfile
 
 import pytest
+from flask.testing import FlaskClient
 from flaskr import create_app
-from flaskr.db import get_db, init_db
+from flaskr.db import close_pool, copy_database, get_db, init_db
 
 with open(os.path.join(os.path.dirname(__file__), 'data.sql'), 'rb') as f:
     _data_sql = f.read().decode('utf8')
 
-@pytest.fixture
-def app():
+@pytest.fixture(scope='session')
+def template_db():
     db_fd, db_path = tempfile.mkstemp()
-    
     app = create_app({
         'TESTING': True,
         'DATABASE': db_path,
+        'DATABASE_POOL_SIZE': 0,
+        'JINJA_BYTECODE_CACHE': False,
     })
 
     with app.app_context():
         init_db()
         get_db().executescript(_data_sql)
+
+    # Keep the finished database in memory and drop the file
+    template = sqlite3.connect(':memory:', check_same_thread=False)
+    source = sqlite3.connect(db_path)
+    source.backup(template)
+    source.close()
+    os.close(db_fd)
+    os.unlink(db_path)
+
+    yield template
+
+    template.close()
+
+@pytest.fixture
+def app(template_db):
+    db_fd, db_path = tempfile.mkstemp()
+    copy_database(template_db, db_path)
     
+    # Tests never write to the instance folder's template cache; the
+    # tests of the cache turn it on in a temporary directory
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': db_path,
+        'JINJA_BYTECODE_CACHE': False,
+    })
+
     yield app
 
+    close_pool(app)
     os.close(db_fd)
     os.unlink(db_path)
 
+class SendingClient(FlaskClient):
+    response = None
+
+    def open(self, *args, **kwargs):
+        self.send_response()
+        self.response = super().open(*args, **kwargs)
+        return self.response
+
+    def send_response(self):
+        if self.response is not None:
+            self.response.get_data()
+            self.response.close()
+            self.response = None
+
 @pytest.fixture
 def client(app):
-    return app.test_client()
+    app.test_client_class = SendingClient
+    client = app.test_client()
+    yield client
+    client.send_response()
 
 @pytest.fixture
 def runner(app):
@@ -54,10 +100,15 @@ def runner(app):
 tempfile.mkstemp creates a temporary file that returns a file object and
  the name of the file at the same time. The DATABASE path is overridden so 
  it points to this temporary path instead of the instance folder. 
- After setting the path, the DATABASE tables are created and the test data
- is inserted (test/data.sql).
  When the test is complete, the temporary file is closed and removed.
 
+1a. template_db
+The DATABASE tables are created and the test data is inserted 
+ (test/data.sql) only once per test session, into an in-memory template.
+ Every test then gets its own copy of the template in its temporary file,
+ made with the sqlite3 backup API, so tests stay isolated from each other
+ without running schema.sql every time.
+
 2. TESTING
 Tells Flask that the app is in test mode
 
@@ -66,6 +117,10 @@ Client - These use the created app fixture to make requests to the
  application without running the server
 Runner - creates a runner that can call the Click conmmands registered
  with the application. 
+SendingClient reads each response to the end and closes it before the next
+ request, like a server sending it would. A streamed page holds on to its
+ request context until then, so one left unread would otherwise still be
+ open when the next request starts.
 '''
 
 # AUTHENTICATION
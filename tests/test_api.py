@@ -0,0 +1,64 @@
+import pytest
+from flaskr.db import get_db
+
+def test_posts(client):
+    response = client.get('/api/posts')
+    assert response.is_streamed
+    data = response.get_json()
+    assert data['next'] is None and data['prev'] is None
+    assert data['posts'] == [{
+        'id': 1,
+        'title': 'test title',
+        'excerpt': 'test\nbody',
+        'created': '2018-01-01T00:00:00',
+        'author': 'test',
+    }]
+
+def test_posts_fields_and_cursor(client, app):
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "INSERT INTO post (title, body, author_id, created)"
+            " VALUES ('second', '', 2, '2018-01-02 00:00:00')"
+        )
+        db.commit()
+
+    data = client.get('/api/posts?fields=title&limit=1').get_json()
+    assert data['posts'] == [{'title': 'second'}]
+    data = client.get(
+        '/api/posts?fields=title,author&before=' + data['next']
+    ).get_json()
+    assert data['posts'] == [{'title': 'test title', 'author': 'test'}]
+    assert data['prev'] is not None
+
+@pytest.mark.parametrize('path', (
+    '/api/posts?fields=password',
+    '/api/posts/1?fields=id,nope',
+))
+def test_unknown_fields(client, path):
+    response = client.get(path)
+    assert response.status_code == 400
+    assert 'Unknown fields' in response.get_json()['error']
+
+def test_post(client):
+    data = client.get('/api/posts/1?fields=id,body').get_json()
+    assert data == {'id': 1, 'body': 'test\nbody'}
+    response = client.get('/api/posts/2')
+    assert response.status_code == 404
+    assert 'error' in response.get_json()
+
+def test_api_etag(client, auth):
+    etag = client.get('/api/posts').headers['ETag']
+    assert client.get(
+        '/api/posts', headers={'If-None-Match': etag}
+    ).status_code == 304
+    etag = client.get('/api/posts/1').headers['ETag']
+    assert client.get(
+        '/api/posts/1', headers={'If-None-Match': etag}
+    ).status_code == 304
+
+    auth.login()
+    client.post('/1/update', data={'title': 'updated', 'body': ''})
+    response = client.get('/api/posts/1', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['title'] == 'updated'
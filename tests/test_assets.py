@@ -0,0 +1,66 @@
+import gzip
+
+from flask import url_for
+from flaskr import create_app
+
+def test_unbuilt_static(client):
+    response = client.get('/static/style.css')
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers.get('Cache-Control', '')
+
+def test_build_assets(app, tmp_path):
+    app.config['ASSETS_FOLDER'] = str(tmp_path)
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['build-assets'])
+    assert 'style.css -> dist/style.' in result.output
+
+    # the manifest is read when the app starts
+    built = create_app({'TESTING': True, 'ASSETS_FOLDER': str(tmp_path)})
+    client = built.test_client()
+    with built.test_request_context():
+        url = url_for('static', filename='style.css')
+    assert url.startswith('/static/dist/style.') and url.endswith('.css')
+
+    plain = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'immutable' in plain.headers['Cache-Control']
+    assert plain.headers.get('Content-Encoding') is None
+
+    packed = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert packed.mimetype == 'text/css'
+    assert gzip.decompress(packed.data) == plain.data
+
+def test_rebuild_keeps_served_names(app, tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'style.css').write_text('body { color: red; }')
+    app.static_folder = str(static)
+    app.config['ASSETS_FOLDER'] = str(tmp_path / 'dist')
+    runner = app.test_cli_runner()
+    runner.invoke(args=['build-assets'])
+
+    running = create_app({'TESTING': True, 'ASSETS_FOLDER': str(tmp_path / 'dist')})
+    with running.test_request_context():
+        old = url_for('static', filename='style.css')
+
+    (static / 'style.css').write_text('body { color: blue; }')
+    runner.invoke(args=['build-assets'])
+    # an app started before the rebuild still serves the name it links to
+    assert running.test_client().get(old).status_code == 200
+
+    result = runner.invoke(args=['build-assets', '--keep', '1'])
+    assert 'Removed' in result.output
+    assert running.test_client().get(old).status_code == 404
+
+def test_build_refuses_static_folder(app, tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'style.css').write_text('body {}')
+    app.static_folder = str(static)
+    runner = app.test_cli_runner()
+    for folder in (static, tmp_path):
+        app.config['ASSETS_FOLDER'] = str(folder)
+        result = runner.invoke(args=['build-assets'])
+        assert result.exit_code != 0
+        assert 'holds the static files' in result.output
+    assert (static / 'style.css').exists()
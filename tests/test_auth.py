@@ -6,6 +6,7 @@ With the auth fixture, you can call auth.login() in a test to log in as the test
 
 import pytest
 from flask import g, session
+from flaskr.auth import invalidate_user, user_cache_stats
 from flaskr.db import get_db
 
 # TESTING THE RESITRATION
@@ -84,4 +85,26 @@ def test_logout(client, auth):
 
     with client:
         auth.logout()
-        assert 'user_id' not in session
\ No newline at end of file
+        assert 'user_id' not in session
+
+# TESTING THE USER CACHE
+'''
+Repeat requests from a logged in user are served from the user cache, and
+ the cached record never carries the password hash.
+'''
+
+def test_user_cache(client, auth, app):
+    auth.login()
+    client.get('/')
+    client.get('/')
+
+    with client:
+        client.get('/')
+        assert g.user == {'id': 1, 'username': 'test'}
+        stats = user_cache_stats()
+        assert stats['misses'] == 1
+        assert stats['hits'] >= 2
+
+        invalidate_user(1)
+        client.get('/')
+        assert user_cache_stats()['misses'] == 2
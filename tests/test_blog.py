@@ -86,4 +86,235 @@ def test_delete(client, auth, app):
     with app.app_context():
         db = get_db()
         post = db.execute('SELECT * FROM post WHERE id = 1').fetchone()
-        assert post is None
\ No newline at end of file
+        assert post is None
+
+def test_index_pagination(client, app):
+    app.config['POSTS_PER_PAGE'] = 2
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id, created)'
+            ' VALUES (?, ?, 1, ?)',
+            [('post {0}'.format(i), '', '2018-01-0{0} 00:00:00'.format(i))
+             for i in range(2, 6)]
+        )
+        db.commit()
+
+    response = client.get('/')
+    assert b'post 5' in response.data and b'post 4' in response.data
+    assert b'post 3' not in response.data
+    assert b'Newer' not in response.data
+    assert b'before=2018-01-04' in response.data
+
+    response = client.get('/?before=2018-01-04 00:00:00_4')
+    assert b'post 3' in response.data and b'post 2' in response.data
+    assert b'post 4' not in response.data
+    assert b'after=2018-01-03' in response.data
+
+    response = client.get('/?after=2018-01-03 00:00:00_3')
+    assert b'post 5' in response.data and b'post 4' in response.data
+    assert b'Newer' not in response.data
+
+    assert client.get('/?before=nonsense').status_code == 400
+
+def test_index_streamed(client, app):
+    app.config['POSTS_PER_PAGE'] = 3
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id, created)'
+            ' VALUES (?, ?, 1, ?)',
+            [('post {0}'.format(i), '', '2018-01-0{0} 00:00:00'.format(i))
+             for i in range(2, 6)]
+        )
+        db.commit()
+
+    response = client.get('/')
+    assert response.is_streamed
+    # a rule between posts, none after the last one on the page
+    assert response.data.count(b'<hr>') == 2
+    assert b'before=2018-01-03' in response.data
+    # the fragment was cached once the page was sent
+    assert client.get('/').data == response.data
+
+
+def test_write_while_streaming(client, app):
+    # the index starts streaming, a post is written before it is read
+    response = client.get('/')
+    writer = app.test_client()
+    writer.post('/auth/login', data={'username': 'test', 'password': 'test'})
+    writer.post('/create', data={'title': 'mid-stream', 'body': ''})
+    assert b'mid-stream' not in response.data
+
+    # the page it sent is not cached over the write
+    assert b'mid-stream' in client.get('/').data
+
+
+def test_search(client, auth, app):
+    assert client.get('/search').status_code == 200
+    response = client.get('/search?q=body')
+    assert b'test title' in response.data
+    assert b'<mark>body</mark>' in response.data
+    assert b'No posts match' in client.get('/search?q=missing').data
+    # FTS5 syntax is searched for literally
+    assert client.get('/search?q="*').status_code == 200
+    assert client.get('/search?q=test&page=999999999999999999999').status_code == 400
+
+    auth.login()
+    client.post('/1/update', data={'title': 'updated', 'body': '<b>new</b>'})
+    assert b'test title' not in client.get('/search?q=body').data
+    response = client.get('/search?q=new')
+    assert b'&lt;b&gt;<mark>new</mark>' in response.data
+
+
+def test_rebuild_search(runner, app):
+    with app.app_context():
+        db = get_db()
+        db.execute("INSERT INTO post_fts (post_fts) VALUES ('delete-all')")
+        db.commit()
+
+    result = runner.invoke(args=['rebuild-search'])
+    assert 'Indexed 1 posts' in result.output
+
+    with app.app_context():
+        assert get_db().execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'body'"
+        ).fetchone()[0] == 1
+
+
+def test_index_conditional_get(client, auth):
+    response = client.get('/')
+    etag = response.headers['ETag']
+    # the page differs per viewer, which a date can't tell apart
+    assert response.last_modified is None
+
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    # another viewer gets another page
+    auth.login()
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 200
+    response = client.get('/', headers={
+        'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'
+    })
+    assert response.status_code == 200
+    assert b'New' in response.data
+    assert client.get('/1').last_modified is None
+    etag = client.get('/').headers['ETag']
+
+    client.post('/1/update', data={'title': 'updated', 'body': ''})
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'updated' in response.data
+
+
+def test_update_conditional_get(client, auth, app):
+    auth.login()
+    etag = client.get('/1/update').headers['ETag']
+    assert client.get(
+        '/1/update', headers={'If-None-Match': etag}
+    ).status_code == 304
+
+    with app.app_context():
+        db = get_db()
+        db.execute(
+            "UPDATE post SET updated = '2030-01-01 00:00:00' WHERE id = 1"
+        )
+        db.commit()
+    assert client.get(
+        '/1/update', headers={'If-None-Match': etag}
+    ).status_code == 200
+
+    # two edits within the same second still change the ETag
+    client.post('/1/update', data={'title': 'a', 'body': ''})
+    etag = client.get('/1/update').headers['ETag']
+    client.post('/1/update', data={'title': 'b', 'body': ''})
+    assert client.get(
+        '/1/update', headers={'If-None-Match': etag}
+    ).status_code == 200
+
+
+def test_detail(client, auth):
+    # not rendered yet, the plain body is shown
+    assert b'test\nbody' in client.get('/1').data
+    assert client.get('/2').status_code == 404
+
+    auth.login()
+    client.post('/1/update', data={'title': 'updated', 'body': '**bold**'})
+    assert b'<strong>bold</strong>' in client.get('/1').data
+    assert b'<p class="body">bold</p>' in client.get('/').data
+
+
+def test_author(client, auth, app):
+    response = client.get('/u/test')
+    assert b'Posts by test' in response.data
+    assert b'1 post<' in response.data
+    assert b'test title' in response.data
+    assert b'test title' not in client.get('/u/other').data
+    assert b'0 posts' in client.get('/u/other').data
+    assert client.get('/u/nobody').status_code == 404
+
+    auth.login()
+    client.post('/create', data={'title': 'second', 'body': ''})
+    response = client.get('/u/test')
+    assert b'2 posts' in response.data
+    assert b'second' in response.data
+
+    client.post('/1/delete')
+    assert b'1 post<' in client.get('/u/test').data
+
+    with app.app_context():
+        plan = ' '.join(row[-1] for row in get_db().execute(
+            'EXPLAIN QUERY PLAN SELECT p.id FROM post p'
+            ' JOIN user u ON p.author_id = u.id WHERE author_id = ?'
+            ' ORDER BY created DESC, p.id DESC LIMIT 21', (1,)
+        ))
+    assert 'USING COVERING INDEX post_author_created (author_id=?)' in plan
+
+
+def test_feed(client, auth, app):
+    response = client.get('/feed.atom')
+    assert response.mimetype == 'application/atom+xml'
+    assert b'<title>test title</title>' in response.data
+    assert b'<id>http://localhost/1</id>' in response.data
+    etag = response.headers['ETag']
+
+    # served from memory: a change behind the app's back isn't seen
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET title = 'sneaky' WHERE id = 1")
+        db.commit()
+    assert client.get(
+        '/feed.atom', headers={'If-None-Match': etag}
+    ).status_code == 304
+
+    auth.login()
+    client.post('/create', data={'title': 'new <post>', 'body': '<b>x</b>'})
+    response = client.get('/feed.atom', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'<title>new &lt;post&gt;</title>' in response.data
+    assert b'&lt;p&gt;&amp;lt;b&amp;gt;x' in response.data
+
+
+def test_feed_per_host(client):
+    client.get('/feed.atom', headers={'Host': 'evil.example'})
+    response = client.get('/feed.atom')
+    assert b'evil.example' not in response.data
+    assert b'<id>http://localhost/1</id>' in response.data
+
+
+def test_feed_modified_on_delete(client, auth, app):
+    with app.app_context():
+        db = get_db()
+        # the post itself is newer than the last change to the list
+        db.execute("UPDATE post_version SET modified = '2018-01-01 00:00:00'")
+        db.commit()
+    last_modified = client.get('/feed.atom').headers['Last-Modified']
+    assert '2018' in last_modified
+
+    auth.login()
+    client.post('/1/delete')
+    response = client.get(
+        '/feed.atom', headers={'If-Modified-Since': last_modified}
+    )
+    assert response.status_code == 200
+    assert b'test title' not in response.data
@@ -0,0 +1,46 @@
+from flaskr.cache import LRUCache, post_tag
+from flaskr.db import get_db
+
+def test_page_cache_lru():
+    cache = LRUCache(2)
+    cache.set(('index', 1), 'a')
+    cache.set(('index', 2), 'b')
+    cache.get(('index', 1))
+    cache.set(('index', 3), 'c')
+    # ('index', 2) was the least recently used entry
+    assert cache.get(('index', 2)) is None
+    assert cache.get(('index', 1)) == 'a'
+    assert cache.stats()['hits'] == 2
+
+def test_page_cache_invalidate():
+    cache = LRUCache(10)
+    cache.set(('index', None), 'a', [post_tag(1)])
+    cache.set(('index', 1), 'b', [post_tag(2)])
+    cache.invalidate(post_tag(1))
+    assert cache.get(('index', None)) is None
+    assert cache.get(('index', 1)) == 'b'
+    cache.invalidate_group('index')
+    assert cache.get(('index', 1)) is None
+
+def test_page_cache_disabled():
+    cache = LRUCache(0)
+    cache.set(('index',), 'a')
+    assert cache.get(('index',)) is None
+
+"""
+Views serve the cached fragment until a write invalidates it; a change made
+ behind the app's back stays invisible until then.
+"""
+def test_index_cached_until_write(client, auth, app):
+    assert b'test title' in client.get('/').data
+
+    with app.app_context():
+        db = get_db()
+        db.execute("UPDATE post SET title = 'sneaky' WHERE id = 1")
+        db.commit()
+    assert b'test title' in client.get('/').data
+
+    auth.login()
+    client.post('/1/update', data={'title': 'updated', 'body': ''})
+    auth.logout()
+    assert b'updated' in client.get('/').data
@@ -0,0 +1,37 @@
+import gzip
+import zlib
+
+import pytest
+
+@pytest.mark.parametrize(('accept', 'decompress'), (
+    ('gzip', gzip.decompress),
+    ('deflate', zlib.decompress),
+    ('deflate, gzip;q=0.5', zlib.decompress),
+))
+def test_compressed_page(client, app, accept, decompress):
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    plain = client.get('/')
+    packed = client.get('/', headers={'Accept-Encoding': accept})
+    assert packed.headers['Content-Encoding'] == accept.split(',')[0]
+    assert 'Accept-Encoding' in packed.headers['Vary']
+    assert decompress(packed.data) == plain.data
+
+def test_compressed_output_cached(client, app):
+    app.config['COMPRESS_MIN_SIZE'] = 0
+    client.get('/', headers={'Accept-Encoding': 'gzip'})
+    client.get('/', headers={'Accept-Encoding': 'gzip'})
+    stats = app.extensions['flaskr_compress_cache'].stats()
+    assert stats['hits'] == 1 and stats['entries'] == 1
+
+def test_compressed_stream(client, app):
+    packed = client.get('/api/posts', headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in packed.headers
+    assert b'test title' in gzip.decompress(packed.data)
+
+def test_not_compressed(client):
+    # too small
+    response = client.get('/hello', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    # not asked for
+    assert 'Content-Encoding' not in client.get('/').headers
@@ -7,10 +7,13 @@ Within an application context, get_db should return the same connection each tim
 import sqlite3
 
 import pytest
-from flaskr.db import get_db
+from flaskr import create_app
+from flaskr.db import close_pool, get_db, get_pool, migrate_db, pool_stats
 
 def test_get_close_db(app):
+    app.config['DATABASE_POOL_SIZE'] = 0
     with app.app_context():
+        close_pool()
         db = get_db()
         assert db is get_db()
 
@@ -19,6 +22,48 @@ def test_get_close_db(app):
 
     assert 'closed' in str(e.value)
 
+"""
+With pooling on, close_db hands the connection back to the pool instead of
+ closing it, and the next app context borrows the same connection again.
+"""
+def test_pooled_db(app):
+    with app.app_context():
+        db = get_db()
+        assert db.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert pool_stats()['in_use'] == 1
+
+    with app.app_context():
+        assert get_db() is db
+        stats = pool_stats()
+        assert stats['opened'] == 1
+        assert stats['reused'] >= 1
+
+def test_pool_timeout(app, client):
+    app.config.update(DATABASE_POOL_SIZE=1, DATABASE_POOL_TIMEOUT=0.01)
+    with app.app_context():
+        held = get_pool().acquire()
+        assert client.get('/').status_code == 503
+        get_pool().release(held)
+    assert client.get('/').status_code == 200
+
+def test_shared_memory_db(template_db):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': 'file:test_shared_memory_db?mode=memory&cache=shared',
+        'DATABASE_URI': True,
+    })
+    with app.app_context():
+        keep = get_pool().acquire()
+        template_db.backup(keep)
+        # a second pooled connection sees the same in-memory database
+        other = get_pool().acquire()
+        assert other is not keep
+        count = other.execute('SELECT COUNT(*) FROM post').fetchone()[0]
+        assert count == 1
+        get_pool().release(other)
+        get_pool().release(keep)
+    close_pool(app)
+
 """
 monkeypatch dynamically changes a piece of software (e.g., a module, object, method, or function) at runtime. Pytest uses this feature to allow the testing of functions or methods that you don’t want to actually execute.
 This test uses Pytest’s monkeypatch fixture to replace the init_db function with one that records that it’s been called. The runner fixture you wrote above is used to call the init-db command by name.
@@ -33,4 +78,118 @@ def test_init_db_commander(runner, monkeypatch):
     monkeypatch.setattr('flaskr.db.init_db', fake_init_db)
     result = runner.invoke(args=['init-db'])
     assert 'Initialised' in result.output
-    assert Recorder.called
\ No newline at end of file
+    assert Recorder.called
+
+"""
+A database made by the original schema.sql (user_version 0) must be brought
+ up to date by db-migrate without losing its rows, and end up with the same
+ tables, indexes and triggers as a freshly initialised one.
+"""
+_baseline_sql = '''
+CREATE TABLE user (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  username TEXT UNIQUE NOT NULL,
+  password TEXT NOT NULL);
+
+CREATE TABLE post (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  author_id INTEGER NOT NULL,
+  created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  title TEXT NOT NULL,
+  body TEXT NOT NULL,
+  FOREIGN KEY (author_id) REFERENCES user (id)
+);
+
+INSERT INTO user (username, password) VALUES ('old', '!');
+INSERT INTO post (title, body, author_id, created)
+VALUES ('old title', 'old body', 1, '2017-01-01 00:00:00');
+'''
+
+def _schema(db):
+    return sorted(db.execute(
+        "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+    ).fetchall(), key=tuple)
+
+def test_migrate_baseline(app, runner):
+    with app.app_context():
+        db = get_db()
+        expected = [tuple(row) for row in _schema(db)]
+        db.executescript(
+            'DROP TABLE post_version; DROP TABLE post_fts; DROP TABLE post;'
+            ' DROP TABLE user; PRAGMA user_version = 0;' + _baseline_sql
+        )
+
+    result = runner.invoke(args=['db-migrate'])
+    assert 'Applied 0001_post_indexes.sql' in result.output
+    assert 'Database is at version 6' in result.output
+
+    with app.app_context():
+        db = get_db()
+        assert [tuple(row) for row in _schema(db)] == expected
+        post = db.execute('SELECT * FROM post').fetchone()
+        assert post['updated'] == post['created']
+        assert db.execute(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH 'old'"
+        ).fetchone() is not None
+
+    result = runner.invoke(args=['db-migrate'])
+    assert 'Applied' not in result.output
+
+def test_migrate_rolls_back(app, monkeypatch):
+    with app.app_context():
+        db = get_db()
+        db.execute('PRAGMA user_version = 0')
+        # 0001 works, 0002 fails because post_new is in the way
+        db.execute('CREATE TABLE post_new (id INTEGER)')
+        with pytest.raises(sqlite3.OperationalError):
+            migrate_db()
+        assert db.execute('PRAGMA user_version').fetchone()[0] == 1
+        assert db.execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+
+"""
+The queries the blog runs must be served by indexes. Every statement a
+ request runs is traced and its EXPLAIN QUERY PLAN checked.
+"""
+def test_blog_query_plans(app, client, auth):
+    statements = []
+    with app.app_context():
+        get_db().set_trace_callback(statements.append)
+
+    auth.login()
+    client.get('/')
+    client.get('/?before=2018-01-01 00:00:00_1')
+    client.get('/1/update')
+
+    with app.app_context():
+        db = get_db()
+        db.set_trace_callback(None)
+        plans = {
+            sql: ' '.join(row[-1] for row in db.execute('EXPLAIN QUERY PLAN ' + sql))
+            for sql in statements if 'FROM post p' in sql
+        }
+
+    index_plans = [plan for sql, plan in plans.items() if 'ORDER BY created' in sql]
+    post_plans = [plan for sql, plan in plans.items() if 'WHERE p.id' in sql]
+    assert len(index_plans) == 2 and post_plans
+    for plan in index_plans:
+        assert 'USING INDEX post_created_id' in plan
+    for plan in post_plans:
+        assert 'SEARCH p USING INTEGER PRIMARY KEY' in plan
+
+def test_check_post_counts(runner, app):
+    result = runner.invoke(args=['check-post-counts'])
+    assert 'All post counts are correct' in result.output
+
+    with app.app_context():
+        db = get_db()
+        db.execute('UPDATE user SET post_count = 5 WHERE id = 1')
+        db.commit()
+
+    result = runner.invoke(args=['check-post-counts', '--fix'])
+    assert 'test: stored 5, actual 1' in result.output
+    assert 'Fixed 1 post counts' in result.output
+
+    with app.app_context():
+        assert get_db().execute(
+            'SELECT post_count FROM user WHERE id = 1'
+        ).fetchone()[0] == 1
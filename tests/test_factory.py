@@ -1,3 +1,5 @@
+import os
+
 from flaskr import create_app
 
 def test_config():
@@ -6,4 +8,26 @@ def test_config():
 
 def test_hello(client):
     response = client.get('/')
-    assert response.data == b'Hello, world'
\ No newline at end of file
+    assert response.data == b'Hello, world'
+
+def test_startup_report(app, client, runner):
+    timer = app.extensions['flaskr_startup']
+    assert 'blog blueprint' in [name for name, seconds in timer.steps]
+    client.get('/hello')
+    assert timer.first_request is not None
+
+    result = runner.invoke(args=['startup-report'])
+    assert 'create_app total' in result.output
+    assert 'load blog/index.html' in result.output
+
+def test_compile_templates(app, tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': app.config['DATABASE'],
+        'JINJA_CACHE_DIR': str(tmp_path),
+    })
+    cache = app.jinja_options['bytecode_cache']
+    assert cache.directory == str(tmp_path)
+    result = app.test_cli_runner().invoke(args=['compile-templates'])
+    assert 'Compiled' in result.output
+    assert any(name.endswith('.cache') for name in os.listdir(tmp_path))
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+from werkzeug.exceptions import ServiceUnavailable
+
+from flaskr.hashing import HashingPool, RateLimiter
+
+def test_rate_limiter():
+    limiter = RateLimiter(rate=0, burst=2)
+    assert limiter.allow('a')
+    assert limiter.allow('a')
+    assert not limiter.allow('a')
+    # buckets are per key
+    assert limiter.allow('b')
+
+def test_hashing_pool_overload():
+    pool = HashingPool(workers=1, queue_size=0, method='pbkdf2:sha256:1000')
+    started, release = threading.Event(), threading.Event()
+
+    def slow():
+        started.set()
+        release.wait()
+
+    worker = threading.Thread(target=pool.run, args=(slow,))
+    worker.start()
+    started.wait()
+    with pytest.raises(ServiceUnavailable):
+        pool.generate('secret')
+    release.set()
+    worker.join()
+
+    assert pool.check(pool.generate('secret'), 'secret')
+    stats = pool.stats()
+    assert stats['rejected'] == 1
+    assert stats['hashed'] == 3
+    assert stats['method'] == 'pbkdf2:sha256:1000'
+    pool.shutdown()
+
+def test_hashing_pool_timeout():
+    pool = HashingPool(workers=1, queue_size=0, timeout=0.01)
+    release = threading.Event()
+    with pytest.raises(ServiceUnavailable):
+        pool.run(release.wait)
+    release.set()
+    pool.shutdown()
+    assert pool.stats()['timed_out'] == 1
+
+"""
+Too many login attempts for one username are refused before any hashing.
+"""
+def test_login_throttled(app, auth):
+    app.config['LOGIN_BURST'] = 2
+    auth.login('test', 'a')
+    auth.login('test', 'a')
+    assert auth.login('test', 'a').status_code == 429
@@ -0,0 +1,34 @@
+import logging
+
+def test_server_timing(client):
+    timing = client.get('/1').headers['Server-Timing']
+    assert 'db;dur=' in timing
+    assert 'render;dur=' in timing
+    assert 'total;dur=' in timing
+
+    # a streamed page has no render figure, it renders after the headers
+    timing = client.get('/').headers['Server-Timing']
+    assert 'render;dur=' not in timing
+    assert 'total;dur=' in timing
+    # the post_version lookup and the page itself
+    assert '"2 queries"' in timing
+
+def test_stats_endpoint(client, app):
+    assert client.get('/_stats').status_code == 404
+
+    app.config['SQL_STATS_ENDPOINT'] = True
+    client.get('/')
+    client.get('/')
+    stats = client.get('/_stats').get_json()
+    assert stats['blog.index']['requests'] == 2
+    # the second request only reads post_version, the page is cached
+    assert stats['blog.index']['queries'] == 3
+    # streamed pages add their totals once the body has been sent
+    assert stats['blog.index']['render_ms'] > 0
+
+def test_slow_query_log(client, app, caplog):
+    app.config['SLOW_QUERY_MS'] = 0
+    with caplog.at_level(logging.WARNING):
+        client.get('/')
+    assert 'Slow query' in caplog.text
+    assert 'post_created_id' in caplog.text
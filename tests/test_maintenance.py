@@ -0,0 +1,51 @@
+import time
+
+from flaskr import create_app
+from flaskr.db import get_db
+from flaskr.maintenance import run_maintenance, stop_maintenance
+
+def make_free_pages(app):
+    with app.app_context():
+        db = get_db()
+        db.executemany(
+            'INSERT INTO post (title, body, author_id) VALUES (?, ?, 1)',
+            [('big', 'x' * 4000) for i in range(50)]
+        )
+        db.commit()
+        db.execute("DELETE FROM post WHERE title = 'big'")
+        db.commit()
+        db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return db.execute('PRAGMA freelist_count').fetchone()[0]
+
+def test_maintain_command(runner, app):
+    assert make_free_pages(app) > 0
+    result = runner.invoke(args=['db-maintain', '--checkpoint', 'truncate'])
+    assert 'optimize' in result.output
+    assert 'freed' in result.output
+    lines = dict(
+        line.split(None, 1) for line in result.output.splitlines()
+        if line.startswith(('freelist_pages', 'wal_bytes'))
+    )
+    assert lines['freelist_pages'].split()[-1] == '0'
+    assert lines['wal_bytes'].split()[-1] == '0'
+
+def test_maintain_budget(app):
+    make_free_pages(app)
+    app.config['MAINTENANCE_BUDGET_MS'] = 0
+    report = run_maintenance(app)
+    assert all(result.startswith('skipped') for name, result, seconds in report['steps'])
+    assert report['after']['freelist_pages'] == report['before']['freelist_pages']
+
+def test_maintenance_thread(app):
+    app = create_app({
+        'TESTING': True,
+        'DATABASE': app.config['DATABASE'],
+        'MAINTENANCE_INTERVAL': 0.01,
+    })
+    maintainer = app.extensions['flaskr_maintenance']
+    deadline = time.monotonic() + 5
+    while maintainer.runs == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop_maintenance(app)
+    assert maintainer.runs > 0
+    assert 'flaskr_maintenance' not in app.extensions
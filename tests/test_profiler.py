@@ -0,0 +1,44 @@
+import os
+
+import pytest
+from flaskr.profiler import serializer
+
+@pytest.fixture
+def profiling(app, tmp_path):
+    app.config.update(PROFILER=True, PROFILE_DIR=str(tmp_path))
+    return tmp_path
+
+def test_profiler_off(client, app, profiling):
+    app.config['PROFILER'] = False
+    token = serializer(app).dumps('profile')
+    response = client.get('/', headers={'X-Profile': token})
+    assert 'X-Profile-File' not in response.headers
+    assert os.listdir(profiling) == []
+
+def test_profile_needs_token(client, profiling):
+    assert 'X-Profile-File' not in client.get('/').headers
+    response = client.get('/', headers={'X-Profile': 'forged'})
+    assert 'X-Profile-File' not in response.headers
+
+def test_profile_request(client, app, runner, profiling):
+    token = serializer(app).dumps('profile')
+    response = client.get('/', headers={'X-Profile': token})
+    assert response.status_code == 200
+    name = response.headers['X-Profile-File']
+    response.close()
+    assert os.listdir(profiling) == [name]
+
+    response = client.get('/?_profile=' + token)
+    response.close()
+    assert len(os.listdir(profiling)) == 2
+
+    result = runner.invoke(args=['profile-list'])
+    assert name in result.output
+    result = runner.invoke(args=['profile-show', name, '--limit', '5'])
+    assert 'function calls' in result.output
+    result = runner.invoke(args=['profile-show', 'missing.prof'])
+    assert result.exit_code != 0
+
+def test_profile_token_command(runner, app):
+    token = runner.invoke(args=['profile-token']).output.splitlines()[0]
+    assert serializer(app).loads(token) == 'profile'
@@ -0,0 +1,61 @@
+import re
+
+from flaskr import queries
+from flaskr.db import get_db
+
+# 'SCAN p' walks the whole table and 'SCAN p USING INDEX ...' the whole
+# index; only a LIMIT stops the walk early
+TABLE_SCAN = re.compile(r'^SCAN (post|user|p|u)\b')
+
+def is_full_scan(step, sql):
+    return bool(TABLE_SCAN.match(step)) and not (
+        ' USING ' in step and ' LIMIT ' in sql
+    )
+
+def test_no_full_scans(app):
+    with app.app_context():
+        db = get_db()
+        for name, (sql, example, full_scan) in queries.QUERIES.items():
+            plan = [row[-1] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, example)]
+            scans = [step for step in plan if is_full_scan(step, sql)]
+            if not full_scan:
+                assert not scans, '{0} scans a table: {1}'.format(name, plan)
+
+def test_statements_are_reused(app):
+    # the same arguments always build the very same text
+    columns = 'p.id, created, title'
+    assert queries.index_page(columns, True, 'before') is queries.index_page(columns, True, 'before')
+    assert queries.post_by_id(columns) is queries.post_by_id(columns)
+
+def test_views_use_registered_queries(app, client, auth):
+    statements = []
+    with app.app_context():
+        get_db().set_trace_callback(statements.append)
+
+    auth.login()
+    client.get('/')
+    client.get('/u/test')
+    client.get('/search?q=test')
+    client.get('/feed.atom')
+    client.get('/1')
+    client.post('/1/update', data={'title': 'updated', 'body': ''})
+
+    with app.app_context():
+        get_db().set_trace_callback(None)
+
+    registered = {sql for sql, example, full_scan in queries.QUERIES.values()}
+    # FTS5 runs statements of its own against its shadow tables
+    selects = [
+        sql for sql in statements
+        if sql.startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE'))
+        and "'main'." not in sql
+    ]
+    assert selects
+    # the trace shows the statement with its parameters filled in
+    placeholders = [re.sub(r"\?", '%', sql) for sql in registered]
+    for sql in selects:
+        assert any(matches(sql, pattern) for pattern in placeholders), sql
+
+def matches(sql, pattern):
+    parts = [re.escape(part) for part in pattern.split('%')]
+    return re.fullmatch('.*?'.join(parts), sql, re.S) is not None
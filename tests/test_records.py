@@ -0,0 +1,61 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from flaskr.db import get_db
+from flaskr.records import RECORD_CLASSES, record_class, record_factory
+
+@pytest.fixture
+def db():
+    db = sqlite3.connect(':memory:')
+    db.row_factory = record_factory
+    db.execute('CREATE TABLE post (id INTEGER, title TEXT, created TIMESTAMP)')
+    db.execute("INSERT INTO post VALUES (1, 'a', '2018-01-01 00:00:00.250')")
+    yield db
+    db.close()
+
+def test_record_access(db):
+    row = db.execute('SELECT id, title, created FROM post').fetchone()
+    assert row['title'] == row[1] == row.title == 'a'
+    assert row.keys() == ['id', 'title', 'created']
+    assert len(row) == 3
+    assert dict(row)['id'] == 1
+    with pytest.raises(IndexError):
+        row['body']
+
+def test_timestamp_parsed_when_read(db):
+    row = db.execute('SELECT created FROM post').fetchone()
+    assert row._created == '2018-01-01 00:00:00.250'
+    assert row['created'] == datetime(2018, 1, 1, 0, 0, 0, 250000)
+    assert isinstance(row._created, datetime)
+
+def test_duplicate_and_unnamed_columns(db):
+    row = db.execute('SELECT created, id, created FROM post').fetchone()
+    assert row['created'] == row[2]
+    # not a valid slot name, so a plain sqlite3.Row
+    row = db.execute('SELECT COUNT(*) FROM post').fetchone()
+    assert isinstance(row, sqlite3.Row)
+    assert row[0] == 1
+
+def test_record_app(client, app):
+    app.config['ROW_FACTORY'] = 'record'
+    with app.app_context():
+        post = get_db().execute('SELECT id, created FROM post').fetchone()
+        assert not isinstance(post, sqlite3.Row)
+        assert post['created'] == datetime(2018, 1, 1)
+
+    response = client.get('/')
+    assert b'on 2018-01-01' in response.data
+    assert client.get('/api/posts/1').get_json()['created'] == '2018-01-01T00:00:00'
+
+def test_record_classes_bounded(client, app):
+    app.config['ROW_FACTORY'] = 'record'
+    sizes = []
+    for fields in ('id,title', 'title,id', 'title,id,title'):
+        response = client.get('/api/posts?fields=' + fields)
+        post = response.get_json()['posts'][0]
+        assert list(post) == list(dict.fromkeys(fields.split(',')))
+        sizes.append(record_class.cache_info().currsize)
+    # one select list, whatever order the fields were asked in
+    assert sizes[0] == sizes[-1]
+    assert record_class.cache_info().maxsize == RECORD_CLASSES
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+from flaskr.db import get_db
+from flaskr.render import (MAX_QUOTE_DEPTH, RENDERER_VERSION, make_excerpt,
+                           render_markdown)
+
+@pytest.mark.parametrize(('body', 'html'), (
+    ('# Title', '<h1>Title</h1>'),
+    ('a **b** *c* `*d*`', '<p>a <strong>b</strong> <em>c</em> <code>*d*</code></p>'),
+    ('one\ntwo', '<p>one<br>\ntwo</p>'),
+    ('- a\n- b', '<ul><li>a</li><li>b</li></ul>'),
+    ('1. a', '<ol><li>a</li></ol>'),
+    ('> quote', '<blockquote><p>quote</p></blockquote>'),
+    ('```\n<b>\n```', '<pre><code>&lt;b&gt;</code></pre>'),
+    ('[x](https://example.com)', '<p><a href="https://example.com">x</a></p>'),
+))
+def test_render_markdown(body, html):
+    assert render_markdown(body) == html
+
+def test_render_sanitizes():
+    html = render_markdown('<script>alert(1)</script> [x](javascript:alert(1))')
+    assert '<script>' not in html
+    assert 'href' not in html
+
+def test_render_hostile_input():
+    html = render_markdown('>' * 3000)
+    assert html.count('<blockquote>') == MAX_QUOTE_DEPTH
+    # emphasis that never closes can't make the patterns backtrack
+    start = time.perf_counter()
+    render_markdown('*a ' * 20000)
+    render_markdown('**a ' * 20000)
+    assert time.perf_counter() - start < 1
+
+def test_excerpt():
+    assert make_excerpt(render_markdown('# A\n\nb & c')) == 'A\nb & c'
+    assert make_excerpt(render_markdown('word ' * 100), 20) == 'word word word word…'
+
+def test_render_posts_command(runner, app):
+    result = runner.invoke(args=['render-posts', '--batch-size', '1'])
+    assert 'Rendered 1 posts' in result.output
+
+    with app.app_context():
+        post = get_db().execute('SELECT * FROM post WHERE id = 1').fetchone()
+        assert post['body_html'] == '<p>test<br>\nbody</p>'
+        assert post['render_version'] == RENDERER_VERSION
+
+    result = runner.invoke(args=['render-posts'])
+    assert 'Rendered 0 posts' in result.output
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+from flaskr.db import get_db
+
+@pytest.mark.parametrize('filename', ('posts.jsonl', 'posts.csv'))
+def test_export_import_roundtrip(runner, app, tmp_path, filename):
+    path = str(tmp_path / filename)
+    result = runner.invoke(args=['export-posts', path])
+    assert 'Exported 1 posts' in result.output
+
+    result = runner.invoke(args=['import-posts', path, '--batch-size', '1'])
+    assert 'Imported 1 posts' in result.output
+
+    with app.app_context():
+        posts = get_db().execute(
+            'SELECT title, body, created, author_id FROM post ORDER BY id'
+        ).fetchall()
+    assert len(posts) == 2
+    assert tuple(posts[0]) == tuple(posts[1])
+
+def test_import_creates_authors(runner, app, tmp_path):
+    path = tmp_path / 'posts.jsonl'
+    path.write_text('\n'.join(json.dumps(row) for row in (
+        {'title': 'one', 'body': 'a', 'username': 'new'},
+        {'title': 'two', 'body': 'b', 'username': 'new'},
+        {'title': 'three', 'body': 'c', 'username': 'test'},
+    )))
+    result = runner.invoke(args=['import-posts', str(path)])
+    assert 'Imported 3 posts' in result.output
+
+    with app.app_context():
+        db = get_db()
+        assert db.execute('SELECT COUNT(*) FROM user').fetchone()[0] == 3
+        assert db.execute(
+            "SELECT COUNT(*) FROM post p JOIN user u ON p.author_id = u.id"
+            " WHERE username = 'new'"
+        ).fetchone()[0] == 2
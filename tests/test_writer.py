@@ -0,0 +1,62 @@
+import sqlite3
+
+import pytest
+from flaskr.cache import get_page_cache
+from flaskr.db import get_db
+from flaskr.writer import WriteQueue, close_writer
+
+def test_group_commit(tmp_path):
+    path = str(tmp_path / 'writer.sqlite')
+    setup = sqlite3.connect(path)
+    setup.execute('CREATE TABLE t (v INTEGER UNIQUE)')
+    setup.close()
+
+    writer = WriteQueue(
+        lambda: sqlite3.connect(path, check_same_thread=False),
+        batch_size=100, window=0.05
+    )
+    futures = [
+        writer.submit([('INSERT INTO t (v) VALUES (?)', (v,))])
+        for v in (1, 2, 2, 3)
+    ]
+    assert futures[0].result(timeout=5) == 1
+    # the duplicate fails alone, the rest of the batch commits
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[2].result(timeout=5)
+    assert futures[3].result(timeout=5) == 3
+    writer.close()
+
+    assert writer.stats()['batches'] == 1
+    db = sqlite3.connect(path)
+    assert [v for v, in db.execute('SELECT v FROM t ORDER BY v')] == [1, 2, 3]
+    db.close()
+
+def test_write_queue_views(app, client, auth):
+    app.config['WRITE_QUEUE'] = True
+    auth.login()
+
+    client.post('/create', data={'title': 'queued', 'body': ''})
+    # the author reads their own write straight away
+    assert b'queued' in client.get('/').data
+
+    client.post('/1/delete')
+    with app.app_context():
+        assert get_db().execute('SELECT COUNT(*) FROM post').fetchone()[0] == 1
+    close_writer(app)
+
+def test_write_timeout(app, client, auth):
+    app.config.update(
+        WRITE_QUEUE=True, WRITE_TIMEOUT=0, WRITE_BATCH_WINDOW_MS=100
+    )
+    auth.login()
+    assert b'test title' in client.get('/').data
+    with app.app_context():
+        assert get_page_cache().stats()['entries'] > 0
+
+    response = client.post('/create', data={'title': 'late', 'body': ''})
+    assert response.status_code == 503
+    # the write still lands, and the cached pages are dropped once it does
+    close_writer(app)
+    with app.app_context():
+        assert get_page_cache().stats()['entries'] == 0
+    assert b'late' in client.get('/').data